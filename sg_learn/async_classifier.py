@@ -0,0 +1,86 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import queue
+import threading
+import time
+
+from utils import CoherenceError, itp
+
+
+class AsyncClassifier:  # runs C.process on done batches in a thread
+    def __init__(self, C, maxsize):  # C a Classifier
+        #
+        self.C = C
+        # put blocks while maxsize batches are waiting: backpressure on
+        # the proof loop when the classifier falls behind
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.waited = 0.0  # seconds the proof loop was blocked
+        self.batches = 0
+        #
+        self.thread = threading.Thread(target=self.consume, daemon=True)
+        self.thread.start()
+        #
+
+    def consume(self):
+        while True:
+            Data = self.queue.get()
+            try:
+                if Data is None:
+                    return
+                if self.error is None:
+                    self.C.process(Data)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            print("classifier thread failed:", repr(self.error))
+            raise CoherenceError("exiting")
+        return
+
+    def process(self, Data):  # Data should not be modified afterwards
+        self.check()
+        start = time.time()
+        self.queue.put(Data)
+        self.waited += time.time() - start
+        self.batches += 1
+        return
+
+    def flush(self):  # barrier: returns when every batch is classified
+        self.queue.join()
+        self.check()
+        return
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        return
+
+    def printstats(self):
+        print(
+            "classifier batches",
+            itp(self.batches),
+            "proof loop blocked for",
+            round(self.waited, 2),
+            "seconds",
+        )
+        return
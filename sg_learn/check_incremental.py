@@ -0,0 +1,81 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups. 
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+"""
+ checks that the incremental propagation agrees with the full one on random
+ propagated states: run it and enter alpha, beta and model_n as for the
+ main experiment
+"""
+import torch
+
+from constants import Dvc
+from driver import Driver
+from historical import Historical
+from parameters import Parameters
+from utils import itp
+
+HST = Historical(10000)
+Pp = Parameters(HST)
+Dd = Driver(Pp, HST)
+rr1 = Dd.rr1
+rr2 = Dd.rr2
+
+instances = 10
+rounds = 6
+statesperround = 50
+
+
+def checkincremental(Data):
+    # Data are processed active states; makes all the available cuts and
+    # compares the incremental propagation with the full one
+    length = Data["length"]
+    availablexyp = rr1.availablexyp(length, Data["prod"])
+    ivector, xvector, yvector, pvector = availablexyp.nonzero(as_tuple=True)
+    NewData = rr1.upsplitting(Data, ivector, xvector, yvector, pvector)
+    FullData = rr2.process(NewData)
+    IncrementalData = rr2.processIncremental(NewData, xvector, yvector)
+    #
+    full_filters = rr2.filterdata(FullData)
+    incremental_filters = rr2.filterdata(IncrementalData)
+    for fd, idt in zip(full_filters, incremental_filters):
+        assert torch.equal(fd, idt), "incremental propagation filters differ"
+    possible = ~full_filters[2]
+    for ky in rr1.packedkeys:
+        assert torch.equal(
+            FullData[ky][possible], IncrementalData[ky][possible]
+        ), ("incremental propagation differs in " + ky)
+    return FullData, full_filters[0]
+
+
+instancevector = torch.randint(
+    len(Dd.init_left_table), (instances,), dtype=torch.int64, device=Dvc
+)
+Data, activedetect, _, _ = Dd.rr4.RC.processedroots(
+    Dd.initialdata(instancevector, 0)
+)
+Data = rr1.detectsubdata(Data, activedetect)
+checked = 0
+for r in range(rounds):
+    if Data["length"] == 0:
+        break
+    Data, activedetect = checkincremental(Data)
+    checked += Data["length"]
+    # the next states are a random sample of the active children
+    Data = rr1.detectsubdata(Data, activedetect)
+    permutation = torch.randperm(Data["length"], device=Dvc)
+    Data = rr1.indexselectdata(Data, permutation[0:statesperround])
+print("incremental propagation agrees on", itp(checked), "cuts")
@@ -0,0 +1,132 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import shutil
+import time
+
+import torch
+
+from constants import CpuDvc, Dvc
+from spill import linkfile
+
+
+class ProofCheckpoint:  # the state of a full proof in proofloop, on disk
+    def __init__(self, pp):
+        #
+        self.pp = pp
+        #
+        if self.pp.checkpoint_dir is None:
+            self.path = None
+        else:
+            filename = "proof_a{}_b{}.pt".format(self.pp.alpha, self.pp.beta)
+            self.path = os.path.join(self.pp.checkpoint_dir, filename)
+        self.lastsave = time.time()
+        self.savecount = None  # of the checkpoint of the current proof
+        #
+
+    def segmentdirectory(self, savecount):  # the linked spill segments
+        return "{}.segments_{}".format(self.path, savecount)
+
+    def start(self):  # at the start of each proof
+        self.lastsave = time.time()
+        self.savecount = None
+        return
+
+    def due(self, step):  # every checkpoint_steps steps or seconds
+        if self.path is None:
+            return False
+        if (step % self.pp.checkpoint_steps) == 0:
+            return True
+        return time.time() - self.lastsave > self.pp.checkpoint_seconds
+
+    def tocpu(self, item):
+        if torch.is_tensor(item):
+            return item.to(CpuDvc)
+        if isinstance(item, dict):
+            return {ky: self.tocpu(item[ky]) for ky in item.keys()}
+        return item
+
+    def todevice(self, item):
+        if torch.is_tensor(item):
+            return item.to(Dvc)
+        if isinstance(item, dict):
+            return {ky: self.todevice(item[ky]) for ky in item.keys()}
+        return item
+
+    def linksegments(self, Segments, directory):
+        # the spilled segment files stay on disk, hard linked next to the
+        # checkpoint so that they survive being read back by the frontier
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        Linked = []
+        for k, (depth, path, length, multiplicity) in enumerate(Segments):
+            filename = "segment_{}.pt".format(k)
+            linkfile(path, os.path.join(directory, filename))
+            Linked.append((depth, filename, length, multiplicity))
+        return Linked
+
+    def save(self, State):  # written then renamed, never read partially
+        os.makedirs(self.pp.checkpoint_dir, exist_ok=True)
+        previous = self.savecount
+        self.savecount = 0 if previous is None else previous + 1
+        directory = self.segmentdirectory(self.savecount)
+        State = self.tocpu(State)
+        State["savecount"] = self.savecount
+        State["Segments"] = self.linksegments(State["Segments"], directory)
+        State["rng"] = torch.get_rng_state()
+        if torch.cuda.is_available():
+            State["cuda_rng"] = torch.cuda.get_rng_state_all()
+        temporary = self.path + ".tmp"
+        torch.save(State, temporary)
+        os.replace(temporary, self.path)
+        # the previous segments go once the new state is in place
+        if previous is not None:
+            shutil.rmtree(self.segmentdirectory(previous), ignore_errors=True)
+        self.lastsave = time.time()
+        return
+
+    def load(self, sigma):  # None unless there is a checkpoint for sigma
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        State = torch.load(self.path, map_location=CpuDvc)
+        if not torch.equal(State["sigma"], sigma.to(CpuDvc)):
+            print("checkpoint", self.path, "is for other instances")
+            return None
+        torch.set_rng_state(State.pop("rng"))
+        if "cuda_rng" in State:
+            cuda_rng = State.pop("cuda_rng")
+            if torch.cuda.is_available():
+                torch.cuda.set_rng_state_all(cuda_rng)
+        self.savecount = State["savecount"]
+        directory = self.segmentdirectory(self.savecount)
+        State["Segments"] = [
+            (depth, os.path.join(directory, filename), length, multiplicity)
+            for depth, filename, length, multiplicity in State["Segments"]
+        ]
+        self.lastsave = time.time()
+        return self.todevice(State)
+
+    def remove(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        if self.savecount is not None:
+            shutil.rmtree(
+                self.segmentdirectory(self.savecount), ignore_errors=True
+            )
+            self.savecount = None
+        return
@@ -25,11 +25,11 @@ from utils import arangeic, itf, itp, numpr
 
 
 class Classifier:  # this is a very first part of classification up to isomorphism
-    def __init__(self, P, HST: Historical):
+    def __init__(self, P, HST: Historical, RC=None):
         #
         #
         self.Pp = P
-        self.rr4 = Relations4(self.Pp, HST)
+        self.rr4 = Relations4(self.Pp, HST, RC)
         self.rr3 = self.rr4.rr2
         self.rr2 = self.rr4.rr2
         self.rr1 = self.rr4.rr1
@@ -15,8 +15,6 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import gc
-
 import torch
 
 from classifier import Classifier
@@ -25,11 +23,11 @@ from historical import Historical
 from learner import Learner
 from relations_4 import Relations4
 from symmetric_group import SymmetricGroup
+from tree_estimator import TreeSizeEstimator
 from utils import (
     CoherenceError,
     arangeic,
     itp,
-    memReport,
     nump,
     numpi,
     numpr,
@@ -57,15 +55,25 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
         #
         self.zbinatable = self.makezbinatable()
         #
-        self.init_length, self.init_left_table = self.make_init_left_table()
+        self.init_length, self.init_left_table = self.rr4.RC.lefttable(
+            self.make_init_left_table
+        )
         #
         self.donecount_collection = 0
         self.ECN_collection = 0.0
         self.ECN_average = 0.0
         #
-        self.Cc = Classifier(self.Pp, HST)
+        self.Cc = Classifier(self.Pp, HST, self.rr4.RC)
+        #
+        self.TE = TreeSizeEstimator(self.rr4)
         #
         self.Ll = Learner(self.rr4, HST)
+        self.rr4.MG.register("OutlierPrePool", lambda: self.Ll.OutlierPrePool)
+        self.rr4.MG.register("ExplorePrePool", lambda: self.Ll.ExplorePrePool)
+        self.rr4.MG.register(
+            "ExamplesPrePool", lambda: self.Ll.ExamplesPrePool
+        )
+        self.rr4.MG.register("Examples", lambda: self.Ll.Examples)
         #
         self.HST = HST
         self.HST.record_driver(self.alpha, self.beta)
@@ -523,10 +531,15 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
             (length, a, a, a, 2), dtype=torch.bool, device=Dvc
         )
         #
-        info = torch.zeros(
-            (length, self.Pp.infosize), dtype=torch.int64, device=Dvc
-        )
-        info[:, self.Pp.sampleinfolower : self.Pp.sampleinfoupper] = -1
+        # narrow per-node columns: the dropout phase, a location used by the
+        # minimizer and the nearest sampled ancestor (-1 if there is none)
+        phase = torch.zeros((length), dtype=torch.int8, device=Dvc)
+        location = torch.zeros((length), dtype=torch.int32, device=Dvc)
+        ancestor = torch.full((length,), -1, dtype=torch.int32, device=Dvc)
+        # how many identical nodes this one stands for
+        multiplicity = torch.ones((length), dtype=torch.int64, device=Dvc)
+        # the left table instance the node descends from
+        sigma = instancevector.to(torch.int32)
         #
         #
         RawData = {
@@ -536,7 +549,11 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
             "left": left,
             "right": right,
             "ternary": ternary,
-            "info": info,
+            "phase": phase,
+            "location": location,
+            "ancestor": ancestor,
+            "multiplicity": multiplicity,
+            "sigma": sigma,
         }
         #
         if dropoutlimit > 0:
@@ -557,8 +574,8 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
             phase12_upper = 0.8
             phase1 = tirage < phase1_upper
             phase2 = (tirage < phase12_upper) & (~phase1)
-            AugmentedData["info"][:, self.Pp.phase][phase2] = 2
-            AugmentedData["info"][:, self.Pp.phase][phase1] = 1
+            AugmentedData["phase"][phase2] = 2
+            AugmentedData["phase"][phase1] = 1
             return AugmentedData
         return RawData
 
@@ -584,8 +601,15 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
         return
 
     def classificationproof(
-        self, Mstrat, Mlearn, dropoutlimit, proving_instances, title_text
-    ):  # dropoutlimit =-1 for no dropout
+        self,
+        Mstrat,
+        Mlearn,
+        dropoutlimit,
+        proving_instances,
+        title_text,
+        resume=False,
+    ):  # dropoutlimit =-1 for no dropout; resume continues a full proof
+        # from the checkpoint in Pp.checkpoint_dir
         print("---   ---   ---   ---   ---   ---   ---   ---   ---")
         print("                classification proof")
         print("---   ---   ---   ---   ---   ---   ---   ---   ---")
@@ -604,10 +628,12 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
         InitialData = self.initialdata(proving_instances, dropoutlimit)
         #
         if dropoutlimit > 0:
-            AssocInitialData = self.rr2.process(InitialData)
-            activedetect, donedetect, impossibledetect = self.rr2.filterdata(
-                AssocInitialData
-            )
+            (
+                AssocInitialData,
+                activedetect,
+                donedetect,
+                impossibledetect,
+            ) = self.rr4.RC.processedroots(InitialData)
             ActiveInitialData = self.rr1.detectsubdata(
                 AssocInitialData, activedetect
             )
@@ -618,7 +644,7 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
             self.Ll.prepoolExplore(Mlearn, ActiveInitialData, explore_upper)
         #
         pl, ActivePool, DonePool, prooflength = self.rr4.proofloop(
-            Mstrat, Mlearn, self.Cc, InitialData, dropoutlimit
+            Mstrat, Mlearn, self.Cc, InitialData, dropoutlimit, resume
         )
         #
         print("---   ---   ---   ---   ---   ---   ---   ---   ---")
@@ -655,6 +681,34 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
         #
         return
 
+    def estimateproof(self, Mstrat, proving_instances, title_text, probes=0):
+        # estimates the cumulative nodes of classificationproof with
+        # dropoutlimit 0 by random probes (probes=0 for Pp.estimator_probes)
+        if probes == 0:
+            probes = self.Pp.estimator_probes
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        print("           estimate of a classification proof")
+        print("        ", title_text)
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        #
+        InitialData = self.initialdata(proving_instances, 0)
+        estimate, lower, upper = self.TE.estimate(
+            Mstrat, InitialData, probes
+        )
+        self.HST.record_estimate(Mstrat, probes, estimate, lower, upper)
+        #
+        print(
+            "estimated cumulative nodes",
+            numpr(estimate, 1),
+            "from",
+            itp(probes),
+            "probes, interval",
+            numpr(lower, 1),
+            "to",
+            numpr(upper, 1),
+        )
+        return estimate, lower, upper
+
     #### mini programs for creation of the instancevector_title object (it is really a pair)
 
     def InAll(self):
@@ -784,8 +838,8 @@ class Driver:  # to run everything, it includes the sieve for instances sigma
             print(
                 "======      ======      ======      ======      ======      ======"
             )
-            gcc = gc.collect()
-            memReport("mg")
+            self.rr4.MG.step()
+            self.rr4.MG.report()
             print(
                 "======      ======      ======      ======      ======      ======"
             )
@@ -0,0 +1,182 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from state_batch import StateBatch
+from utils import CoherenceError
+
+
+class DepthFrontier:  # the active pool as a bucket queue indexed by depth
+    def __init__(self, spill=None):
+        self.buckets = {}  # depth -> StateBatch
+        self.length = 0  # including the nodes spilled to disk
+        self.resident = 0  # the nodes in the buckets
+        self.multiplicity_total = 0
+        # a SpillStore for the shallowest buckets, once resident passes its
+        # threshold; they come back when the buckets run low
+        self.spill = spill
+
+    def __getitem__(self, ky):  # the other fields go through view()
+        if ky == "length":
+            return self.length
+        return self.view()[ky]
+
+    def keys(self):
+        for bucket in self.buckets.values():
+            if bucket.fields is not None:
+                return bucket.keys()
+        return ["length"]
+
+    def depths(self):  # the non-empty depths, deepest first
+        return sorted(
+            [d for d in self.buckets.keys() if self.buckets[d].length > 0],
+            reverse=True,
+        )
+
+    def bucket(self, depth):
+        if depth not in self.buckets:
+            self.buckets[depth] = StateBatch()
+        return self.buckets[depth]
+
+    def bydepth(self, Data):  # yields depth, rows of Data at that depth
+        length = int(Data["length"])
+        if length == 0:
+            return
+        depth = Data["depth"]
+        dvalues = torch.unique(depth).tolist()
+        if len(dvalues) == 1:
+            yield dvalues[0], Data
+            return
+        for d in dvalues:
+            detection = depth == d
+            SubData = {"length": int(detection.to(torch.int64).sum(0))}
+            for ky in Data.keys():
+                if ky != "length":
+                    SubData[ky] = Data[ky][detection]
+            yield d, SubData
+
+    def push(self, Data):  # each row goes to the bucket of its depth
+        for d, SubData in self.bydepth(Data):
+            self.bucket(d).append(SubData)
+            self.length += int(SubData["length"])
+            self.resident += int(SubData["length"])
+            self.multiplicity_total += int(SubData["multiplicity"].sum(0))
+        self.spillover()
+        return
+
+    def spillover(self):  # the deepest bucket always stays in memory
+        if self.spill is None or self.resident <= self.spill.threshold:
+            return
+        for d in sorted(self.depths())[:-1]:
+            if 2 * self.resident <= self.spill.threshold:
+                break
+            self.spill.write(d, self.buckets[d].view())
+            self.resident -= self.buckets[d].length
+            del self.buckets[d]  # frees the storage
+        return
+
+    def restore(self, amount):  # until amount nodes are in memory
+        if self.spill is None:
+            return
+        while self.resident < amount and len(self.spill.segments) > 0:
+            d, SubData = self.spill.read()
+            self.bucket(d).append(SubData)
+            self.resident += int(SubData["length"])
+        return
+
+    def adopt(self, depth, path, length, multiplicity):  # a saved segment
+        self.spill.adopt(depth, path, length, multiplicity)
+        self.length += length
+        self.multiplicity_total += multiplicity
+        return
+
+    def closespill(self):  # the nodes still on disk are dropped
+        if self.spill is None:
+            return
+        self.length -= self.spill.length
+        self.multiplicity_total -= self.spill.multiplicity_total
+        self.spill.clear()
+        return
+
+    def pop(self, amount):  # up to amount rows taken from the deepest end
+        self.restore(amount)
+        Parts = []
+        remaining = amount
+        for d in self.depths():
+            if remaining == 0:
+                break
+            Part = self.buckets[d].poptail(remaining)
+            remaining -= Part["length"]
+            self.length -= Part["length"]
+            self.resident -= Part["length"]
+            self.multiplicity_total -= int(Part["multiplicity"].sum(0))
+            Parts.append(Part)
+        return self.concatenate(Parts)
+
+    def popdeepest(self, amount):  # only from the deepest bucket
+        self.restore(amount)
+        depths = self.depths()
+        if len(depths) == 0:
+            return {"length": 0}
+        Part = self.buckets[depths[0]].poptail(amount)
+        self.length -= Part["length"]
+        self.resident -= Part["length"]
+        self.multiplicity_total -= int(Part["multiplicity"].sum(0))
+        return Part
+
+    def concatenate(self, Parts):
+        if len(Parts) == 0:
+            return {"length": 0}
+        if len(Parts) == 1:
+            return Parts[0]
+        Output = {"length": sum(Part["length"] for Part in Parts)}
+        for ky in Parts[0].keys():
+            if ky != "length":
+                Output[ky] = torch.cat([Part[ky] for Part in Parts], 0)
+        return Output
+
+    def spilled(self):
+        return self.spill is not None and len(self.spill.segments) > 0
+
+    def view(self):  # the whole pool as one Data dict, deepest first
+        if self.spilled():
+            raise CoherenceError("frontier has segments on disk, use segments")
+        return self.concatenate(
+            [self.buckets[d].view() for d in self.depths()]
+        )
+
+    def residentbuckets(self):  # yields depth, Data of each bucket
+        for d in self.depths():
+            yield d, self.buckets[d].view()
+        return
+
+    def segments(self):  # the buckets, then the spilled segments one by one
+        # without bringing these back into the frontier
+        for d, Data in self.residentbuckets():
+            yield d, Data
+        if self.spill is not None:
+            for d, Data in self.spill.iterate():
+                yield d, Data
+        return
+
+    def rowcounts(self):  # number of rows at each depth, spilled ones too
+        Counts = {d: self.buckets[d].length for d in self.depths()}
+        if self.spill is not None:
+            for d, _, length, _ in self.spill.segments:
+                Counts[d] = Counts.get(d, 0) + length
+        return {d: Counts[d] for d in sorted(Counts.keys())}
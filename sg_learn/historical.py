@@ -76,6 +76,11 @@ class Historical:
             "BenchmarkProof": 12,
             "FullProof": 13,
             "DropoutProof": 14,
+            "Frontier": 15,
+            "Deepest": 16,
+            "Dfs": 17,
+            "Minpeak": 18,
+            "Estimate": 19,
         }
 
     def reset_current_proof(self):
@@ -298,10 +303,41 @@ class Historical:
             self.histi[cursor, 1] = self.D["Uniform"]
         self.histi[cursor, 2] = dropout
         self.histi[cursor, 3] = steps
-        ecnr = torch.round(ECN).to(torch.int64)
+        ecnr = round(float(ECN))
         self.histi[cursor, 4] = ecnr
         return
 
+    def record_frontier(self, policy, steps, peak):
+        cursor = self.increment()
+        #
+        if policy != "deepest" and policy != "dfs" and policy != "minpeak":
+            raise CoherenceError("unsupported policy in record_frontier")
+        #
+        self.histi[cursor, 0] = self.D["Frontier"]
+        if policy == "deepest":
+            self.histi[cursor, 1] = self.D["Deepest"]
+        if policy == "dfs":
+            self.histi[cursor, 1] = self.D["Dfs"]
+        if policy == "minpeak":
+            self.histi[cursor, 1] = self.D["Minpeak"]
+        self.histi[cursor, 2] = steps
+        self.histi[cursor, 3] = peak
+        return
+
+    def record_estimate(self, M, probes, estimate, lower, upper):
+        cursor = self.increment()
+        #
+        self.histi[cursor, 0] = self.D["Estimate"]
+        if M.benchmark:
+            self.histi[cursor, 1] = self.D["Benchmark"]
+        else:
+            self.histi[cursor, 1] = self.D["Global"]
+        self.histi[cursor, 2] = probes
+        self.histi[cursor, 3] = round(estimate)
+        self.histi[cursor, 4] = round(lower)
+        self.histi[cursor, 5] = round(upper)
+        return
+
     def print_history(self):
         length = self.hlength
         print("--  --  --  --  --  --  --  --  --  --  --  --  --  --  --")
@@ -392,6 +428,30 @@ class Historical:
                     "steps with estimated cumulative nodes",
                     d,
                 )
+            #
+            if tag == self.D["Frontier"]:
+                print("frontier policy", end="")
+                if a == self.D["Deepest"]:
+                    print(" deepest ", end="")
+                if a == self.D["Dfs"]:
+                    print(" dfs ", end="")
+                if a == self.D["Minpeak"]:
+                    print(" minpeak ", end="")
+                print("in", b, "steps with peak active pool", c)
+            #
+            if tag == self.D["Estimate"]:
+                if a == self.D["Benchmark"]:
+                    print("BENCHMARK ", end="")
+                print(
+                    "estimate from",
+                    b,
+                    "probes of",
+                    c,
+                    "cumulative nodes, interval",
+                    d,
+                    "to",
+                    e,
+                )
         #
         print("--  --  --  --  --  --  --  --  --  --  --  --  --  --  --")
         print("     end printing history of length", itp(length))
@@ -0,0 +1,121 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import time
+
+import torch
+
+from constants import Dvc
+from utils import arangeic, itp
+
+
+class InferenceEngine:  # the model networks evaluated without autograd
+    def __init__(self, pp, rr1):
+        #
+        self.pp = pp
+        self.rr1 = rr1
+        #
+        # one output buffer per kind of call, grown as needed; a returned
+        # output is only valid until the next call of the same kind
+        self.buffers = {}
+        #
+        self.calls = 0
+        self.seconds = 0.0
+        self.checks = 0
+        self.agreements = 0
+        #
+
+    def store(self, name, output):
+        n = output.numel()
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.numel() < n:
+            capacity = n
+            if buffer is not None and capacity < 2 * buffer.numel():
+                capacity = 2 * buffer.numel()
+            buffer = torch.empty((capacity), dtype=torch.float, device=Dvc)
+            self.buffers[name] = buffer
+        stored = buffer[0:n].view(output.size())
+        # the copy is an ordinary tensor, so callers can modify it in place
+        stored.copy_(output)
+        return stored
+
+    def forward(self, net, Data, name, exact=False):
+        self.calls += 1
+        start = time.perf_counter()
+        with torch.inference_mode():
+            if self.pp.inference_bf16 and not exact and Dvc.type == "cpu":
+                with torch.autocast(device_type="cpu", dtype=torch.bfloat16):
+                    output = net(Data)
+            else:
+                output = net(Data)
+        stored = self.store(name, output)
+        self.seconds += time.perf_counter() - start
+        return stored
+
+    def network(self, M, Data):
+        return self.forward(M.network, Data, "network")
+
+    def network2(self, M, Data, exact=False):
+        if exact:
+            return self.forward(M.network2, Data, "network2_exact", True)
+        return self.forward(M.network2, Data, "network2")
+
+    def extentlog(self, M, Data):
+        # M.network on Data (packed or not), pp.inference_batch rows at a
+        # time, so that many small slices make few calls; a new tensor
+        length = Data["length"]
+        extent_log = torch.zeros((length), dtype=torch.float, device=Dvc)
+        batchsize = self.pp.inference_batch
+        lower = 0
+        while lower < length:
+            upper = lower + batchsize
+            if upper > length:
+                upper = length
+            if lower == 0 and upper == length:
+                DataSlice = self.rr1.unpackdata(Data)
+            else:
+                DataSlice = self.rr1.unpackdata(
+                    self.rr1.indexselectdata(
+                        Data, arangeic(length)[lower:upper]
+                    )
+                )
+            extent_log[lower:upper] = self.network(M, DataSlice)
+            lower = upper
+        return extent_log
+
+    def checkdue(self):  # compare the bfloat16 cuts with fp32 now and then
+        if not self.pp.inference_bf16 or Dvc.type != "cpu":
+            return False
+        return (self.calls % self.pp.inference_check_period) == 0
+
+    def agreement(self, xyvector, xyexact):
+        self.checks += len(xyvector)
+        self.agreements += int((xyvector == xyexact).to(torch.int64).sum(0))
+        return
+
+    def printstats(self):
+        if self.checks == 0:
+            return
+        print(
+            "bfloat16 cut agreement",
+            itp(self.agreements),
+            "of",
+            itp(self.checks),
+            "rate",
+            round(self.agreements / self.checks, 4),
+        )
+        return
@@ -126,7 +126,9 @@ class Learner:  # training the neural networks
         if upper > splength:
             upper = splength
         indices = permutation[0:upper]
-        NewExamples = self.rr1.indexselectdata(Data, indices)
+        NewExamples = self.rr1.unpackdata(
+            self.rr1.indexselectdata(Data, indices)
+        )
         self.check_availability(NewExamples, "prepoolSamples")
         self.ExamplesPrePool = self.rr1.appenddata(
             NewExamples, self.ExamplesPrePool
@@ -340,60 +342,20 @@ class Learner:  # training the neural networks
         splength = SamplePool["length"]
         dplength = DroppedPool["length"]
         #
-        sprectangle = SamplePool["info"][
-            :, self.pp.sampleinfolower : self.pp.sampleinfoupper
-        ].clone()
-        #
-        splrangevxr = (
-            arangeic(splength)
-            .view(splength, 1)
-            .expand(splength, 200)
-            .reshape(splength * 200)
-        )
-        sprectangler = sprectangle.reshape(splength * 200)
-        sp_detection = (sprectangler >= 0) & (sprectangler < splrangevxr)
-        #
-        ivector = splrangevxr[sp_detection]
-        jvector = sprectangler[sp_detection]
-        # note that jvector < ivector because of the second condition in sp_detection
-        # jvector is any previous location strictly above the ivector location in the proof tree
-        #
-        incidence = torch.zeros(
-            (splength, splength), dtype=torch.float, device=Dvc
-        )
-        #
-        incidence[ivector, jvector] = 1.0
-        #
+        # incidence[i,j] = 1 when j is a sample strictly above i in the proof tree
+        incidence = self.rr4.ancestryincidence(SamplePool["ancestor"])
         #
         spnodes = (
             incidence.sum(0) + 1.0
         )  # this should be the number of nodes below that location, including that location
         #
         if dplength > 0:
-            dprectangle = DroppedPool["info"][
-                :, self.pp.sampleinfolower : self.pp.sampleinfoupper
-            ].clone()
+            dincidence = self.rr4.ancestryincidence(DroppedPool["ancestor"])
             #
-            dincidence = torch.zeros(
-                (dplength, splength), dtype=torch.float, device=Dvc
-            )
             #
-            dplrangevxr = (
-                arangeic(dplength)
-                .view(dplength, 1)
-                .expand(dplength, 200)
-                .reshape(dplength * 200)
-            )
-            dprectangler = dprectangle.reshape(dplength * 200)
-            dp_detection = dprectangler >= 0
-            #
-            idvector = dplrangevxr[dp_detection]
-            jdvector = dprectangler[dp_detection]
-            #
-            dincidence[idvector, jdvector] = 1.0
-            #
-            #
-            dpextent_log = M.network(DroppedPool).detach()
+            dpextent_log = M.network(
+                self.rr1.unpackdata(DroppedPool)
+            ).detach()
             # this approximates log10 of (the number of nodes at or below a dropped location)
             dpextent_log = torch.clamp(dpextent_log, 0.0, 9.0)
             dpextent = 10 ** dpextent_log
@@ -414,7 +376,9 @@ class Learner:  # training the neural networks
         if upper > splength:
             upper = splength
         indices = permutation[0:upper]
-        TransferData = self.rr1.indexselectdata(SamplePool, indices)
+        TransferData = self.rr1.unpackdata(
+            self.rr1.indexselectdata(SamplePool, indices)
+        )
         transfer_extent = logextent[indices]
         #
         epp_throw_detection = torch.zeros(
@@ -425,7 +389,7 @@ class Learner:  # training the neural networks
             M, TransferData
         )
         #
-        positivephase = TransferData["info"][:, self.pp.phase] > 0
+        positivephase = TransferData["phase"] > 0
         phased_extent = transfer_extent.clone()
         phased_extent[positivephase] = xyscore_min[positivephase]
         #
@@ -732,41 +696,38 @@ class Learner:  # training the neural networks
         yvector = yrangevxr[availablexypr]
         pvector = prangevxr[availablexypr]
         #
-        NewData = self.rr1.upsplitting(
-            Data, ivector, xvector, yvector, pvector
-        )
-        #
-        #
-        ndlength = NewData["length"]
+        ndlength = len(ivector)
         #
         #
-        LocalExamples = self.rr1.nulldata()
-        detection = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
+        LocalExamplesBatch = self.rr1.newbatch()
         newextent_exp = torch.zeros((ndlength), dtype=torch.float, device=Dvc)
         # that should be the (approximation of) the number of nodes below and including that node resulting from (i,x,y,p)
         newactive = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
-        lower = 0
-        for i in range(ndlength):
-            assert lower < ndlength
-            upper = lower + 1000
-            if upper > ndlength:
-                upper = ndlength
-            detection[:] = False
-            detection[lower:upper] = True
-            NewDataSlice = self.rr1.detectsubdata(NewData, detection)
-            AssocNewDataSlice = self.rr2.process(NewDataSlice)
-            newactive_s, newdone_s, newimpossible_s = self.rr2.filterdata(
-                AssocNewDataSlice
+        self.rr3.MC.enabled = True
+        parentkeys = self.rr3.MC.parentkeys(Data)
+        for lower, upper, NewDataSlice in self.rr1.splitslices(
+            Data, ivector, xvector, yvector, pvector, self.rr3.MB.slicesize
+        ):
+            keys = self.rr3.MC.childkeys(
+                parentkeys,
+                ivector[lower:upper],
+                xvector[lower:upper],
+                yvector[lower:upper],
+                pvector[lower:upper],
             )
+            AssocNewDataSlice, filters_s = self.rr3.MC.processcut(
+                NewDataSlice, keys, xvector[lower:upper], yvector[lower:upper]
+            )
+            newactive_s, newdone_s, newimpossible_s = filters_s
             #
             ActiveNewDataSlice = self.rr1.detectsubdata(
                 AssocNewDataSlice, newactive_s
             )
-            LocalExamples = self.rr1.appenddata(
-                ActiveNewDataSlice, LocalExamples
+            LocalExamplesBatch = self.rr1.appenddata(
+                LocalExamplesBatch, ActiveNewDataSlice
             )
             #
-            predictedscore_s = M.network(AssocNewDataSlice).detach()
+            predictedscore_s = self.rr3.IE.network(M, AssocNewDataSlice)
             if torch.isnan(predictedscore_s).any(0):
                 raise CoherenceError("predicted score nan")
             # recall that approximates log10 of (the number of nodes below and including that node)
@@ -776,9 +737,8 @@ class Learner:  # training the neural networks
             predictedscore_s_exp[newimpossible_s] = 0.1
             newextent_exp[lower:upper] = predictedscore_s_exp
             newactive[lower:upper] = newactive_s
-            lower = upper
-            if lower >= ndlength:
-                break
+        #
+        LocalExamples = self.rr1.batchview(LocalExamplesBatch)
         #
         xypscore_exp[ivector, xvector, yvector, pvector] = newextent_exp
         #
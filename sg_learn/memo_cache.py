@@ -0,0 +1,219 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from constants import Dvc
+from transposition import TranspositionTable
+from utils import arangeic, itp
+
+
+class MemoCache:  # cache of propagated children by (parent, x, y, p)
+    def __init__(self, pp, rr2):
+        #
+        self.pp = pp
+        self.rr2 = rr2
+        self.rr1 = rr2.rr1
+        #
+        self.hasher = TranspositionTable(pp, self.rr1)
+        # the children keys mix the parent hashes with the cut and the
+        # filter flags, using two more random weights
+        self.cutweights = torch.randint(
+            -(2 ** 62),
+            2 ** 62,
+            (2,),
+            dtype=torch.int64,
+            generator=self.hasher.generator,
+        ).tolist()
+        # the proof loop turns it off for full proofs
+        self.enabled = True
+        #
+        # preallocated slabs of packed rows, written as a ring so that the
+        # oldest entries are overwritten first; the keys are kept sorted
+        # by key1 for the lookup
+        self.capacity = None
+        self.slabs = None
+        self.key1 = None
+        self.key2 = None
+        self.hitcode = None
+        self.sortedkey1 = None
+        self.sortedslot = None
+        self.filled = 0
+        self.head = 0
+        self.nbytes = 0
+        #
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        #
+
+    def active(self):
+        return self.enabled and self.pp.memo_cache_bytes > 0
+
+    def parentkeys(self, Data):  # a hash pair for each parent state
+        if not self.active() or Data["length"] == 0:
+            return None
+        return self.hasher.hashes(self.hasher.staterows(Data))
+
+    def childkeys(self, parentkeys, ivector, xvector, yvector, pvector):
+        if parentkeys is None:
+            return None
+        a = self.rr1.alpha
+        bz = self.rr1.betaz
+        flags = int(self.pp.profile_filter_on) + 2 * int(
+            self.pp.halfones_filter_on
+        )
+        cut = ((xvector * a + yvector) * bz + pvector) * 4 + flags + 1
+        key1 = parentkeys[0][ivector] + cut * self.cutweights[0]
+        key2 = parentkeys[1][ivector] + cut * self.cutweights[1]
+        return key1, key2
+
+    def allocate(self, PackedData):  # the slabs, from the first rows
+        rowbytes = 0
+        for ky in self.rr1.packedkeys:
+            item = PackedData[ky]
+            rowbytes += item[0].numel() * item.element_size()
+        # key1, key2, sortedkey1, sortedslot and the code
+        rowbytes += 4 * 8 + 1
+        self.capacity = self.pp.memo_cache_bytes // rowbytes
+        if self.capacity == 0:
+            return
+        self.slabs = {}
+        for ky in self.rr1.packedkeys:
+            self.slabs[ky] = torch.zeros(
+                (self.capacity,) + tuple(PackedData[ky].shape[1:]),
+                dtype=PackedData[ky].dtype,
+                device=Dvc,
+            )
+        self.key1 = torch.zeros((self.capacity), dtype=torch.int64, device=Dvc)
+        self.key2 = torch.zeros((self.capacity), dtype=torch.int64, device=Dvc)
+        self.hitcode = torch.zeros(
+            (self.capacity), dtype=torch.int8, device=Dvc
+        )
+        self.nbytes = self.capacity * rowbytes
+        self.resort()
+        return
+
+    def resort(self):
+        self.sortedkey1, self.sortedslot = torch.sort(self.key1[: self.filled])
+        return
+
+    def lookup(self, keys):  # the slot of each key, and the hits
+        key1, key2 = keys
+        length = len(key1)
+        if self.filled == 0:
+            noslot = torch.zeros((length), dtype=torch.int64, device=Dvc)
+            return noslot, torch.zeros((length), dtype=torch.bool, device=Dvc)
+        position = torch.searchsorted(self.sortedkey1, key1)
+        position = torch.clamp(position, max=self.filled - 1)
+        slot = self.sortedslot[position]
+        hitdetect = (self.key1[slot] == key1) & (self.key2[slot] == key2)
+        return slot, hitdetect
+
+    def insert(self, keys, PackedData, hitcode):
+        length = PackedData["length"]
+        if self.capacity is None:
+            self.allocate(PackedData)
+        if self.capacity == 0 or length == 0:
+            return
+        # only the last capacity rows fit
+        lower = max(0, length - self.capacity)
+        count = length - lower
+        slot = (self.head + arangeic(count)) % self.capacity
+        for ky in self.rr1.packedkeys:
+            self.slabs[ky][slot] = PackedData[ky][lower:]
+        self.key1[slot] = keys[0][lower:]
+        self.key2[slot] = keys[1][lower:]
+        self.hitcode[slot] = hitcode[lower:]
+        self.head = (self.head + count) % self.capacity
+        self.evictions += max(0, self.filled + count - self.capacity)
+        self.filled = min(self.capacity, self.filled + count)
+        self.resort()
+        return
+
+    def processcut(self, Data, keys, xvector, yvector):
+        # Data are the children with their cache keys; like rr2.processcut
+        # with the filters, but the children found in the cache are not
+        # propagated again
+        length = Data["length"]
+        if keys is None or length == 0:
+            Output, filters = self.rr2.processcut(
+                Data, xvector, yvector, withfilters=True
+            )
+            return Output, filters[0:3]
+        #
+        slot, hitdetect = self.lookup(keys)
+        hitlength = int(hitdetect.to(torch.int64).sum(0))
+        self.hits += hitlength
+        self.misses += length - hitlength
+        #
+        Output = self.rr1.copydata(Data)
+        hitcode = torch.zeros((length), dtype=torch.int8, device=Dvc)
+        #
+        if hitlength < length:
+            missdetect = ~hitdetect
+            missindices = arangeic(length)[missdetect]
+            MissData = self.rr1.detectsubdata(Data, missdetect)
+            MissOutput, filters = self.rr2.processcut(
+                MissData,
+                xvector[missindices],
+                yvector[missindices],
+                withfilters=True,
+            )
+            for ky in self.rr1.packedkeys:
+                Output[ky][missindices] = MissOutput[ky]
+            hitcode[missindices] = filters[3]
+            self.insert(
+                (keys[0][missdetect], keys[1][missdetect]),
+                self.rr1.packdata(MissOutput),
+                filters[3],
+            )
+        #
+        if hitlength > 0:
+            hitindices = arangeic(length)[hitdetect]
+            hitslot = slot[hitdetect]
+            PackedHits = {"length": hitlength}
+            for ky in self.rr1.packedkeys:
+                PackedHits[ky] = self.slabs[ky][hitslot]
+            HitData = self.rr1.unpackdata(PackedHits)
+            for ky in self.rr1.packedkeys:
+                Output[ky][hitindices] = HitData[ky]
+            hitcode[hitindices] = self.hitcode[hitslot]
+            # the filter counters as if the hits had been filtered again
+            self.rr2.countfilters(self.hitcode[hitslot])
+        #
+        return Output, self.rr2.filtersfromcode(hitcode)
+
+    def printstats(self):
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return
+        print(
+            "memo cache hits",
+            itp(self.hits),
+            "of",
+            itp(lookups),
+            "hit rate",
+            round(self.hits / lookups, 3),
+            "entries",
+            itp(self.filled),
+            "bytes",
+            itp(self.nbytes),
+            "evictions",
+            itp(self.evictions),
+        )
+        return
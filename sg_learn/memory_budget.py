@@ -0,0 +1,132 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from utils import itp, processrss
+
+
+class MemoryBudget:  # the chunksize and slicesize, tuned to the budget
+    def __init__(self, pp):
+        #
+        self.pp = pp
+        #
+        a = self.pp.alpha
+        a3 = a * a * a
+        bz = self.pp.beta + 1
+        #
+        # the sizes used by rr3, they stay those of pp without a budget
+        self.chunksize = self.pp.chunksize
+        self.slicesize = self.pp.slicesize
+        #
+        # bytes per node, measured on the rows of the pools
+        self.nodebytes = None
+        # transient bytes per child while it is propagated, besides the
+        # copies of its rows
+        if self.pp.propagation_backend == "matmul":
+            self.workbytes = 3 * 4 * (a * a * bz + 4 * a * bz + 2 * a3)
+            self.workbytes += 4 * a3 * bz
+        else:
+            self.workbytes = 4 * 8 * a3 * bz
+        # bytes per available (i,x,y,p) for the cut vectors
+        self.cutbytes = 4 * 8
+        #
+        # observed per parent in managesplit, as moving averages
+        self.fanout = float(a * a * bz)
+        self.survivors = float(a * a * bz)
+        self.observed = 0
+        #
+        self.chunksize_min = 1
+        self.chunksize_max = 100000
+        self.slicesize_min = 16
+        self.slicesize_max = 100000
+        #
+
+    def rowbytes(self, Data):  # of one row of all the tensor fields
+        total = 0
+        for ky in Data.keys():
+            item = Data[ky]
+            if torch.is_tensor(item) and item.dim() > 0 and item.size(0) > 0:
+                total += (item.numel() // item.size(0)) * item.element_size()
+        return total
+
+    def observe(self, Data, children, survivors):  # Data were split
+        parents = Data["length"]
+        if parents == 0:
+            return
+        # the unpacked rows, as the children are made
+        self.nodebytes = self.rowbytes(Data)
+        fanout = float(children) / float(parents)
+        survivorrate = float(survivors) / float(parents)
+        if self.observed == 0:
+            self.fanout = fanout
+            self.survivors = survivorrate
+        else:
+            self.fanout = 0.7 * self.fanout + 0.3 * fanout
+            self.survivors = 0.7 * self.survivors + 0.3 * survivorrate
+        self.observed += 1
+        return
+
+    def tune(self, Data):  # between steps, when only the pools are in memory
+        # Data are rows of the active pool, measured until a split is seen
+        budget = self.pp.memory_budget
+        if budget is None:
+            self.chunksize = self.pp.chunksize
+            self.slicesize = self.pp.slicesize
+            return
+        nodebytes = self.nodebytes
+        if nodebytes is None:
+            nodebytes = self.rowbytes(Data)
+        childbytes = self.workbytes + 4 * nodebytes
+        rss = processrss()
+        available = budget - rss
+        if available < 0.05 * budget:
+            available = 0.05 * budget
+        #
+        # a quarter of what is left for the slice being propagated, half
+        # for the chunk with its cut vectors and surviving children
+        slicesize = int((0.25 * available) / childbytes)
+        if slicesize < self.slicesize_min:
+            slicesize = self.slicesize_min
+        if slicesize > self.slicesize_max:
+            slicesize = self.slicesize_max
+        #
+        parentbytes = (
+            nodebytes
+            + self.fanout * self.cutbytes
+            + self.survivors * nodebytes
+        )
+        chunksize = int((0.5 * available) / parentbytes)
+        if chunksize < self.chunksize_min:
+            chunksize = self.chunksize_min
+        if chunksize > self.chunksize_max:
+            chunksize = self.chunksize_max
+        #
+        self.slicesize = slicesize
+        self.chunksize = chunksize
+        if self.pp.verbose:
+            print(
+                "memory budget: rss",
+                itp(rss),
+                "of",
+                itp(budget),
+                "chunksize",
+                itp(chunksize),
+                "slicesize",
+                itp(slicesize),
+            )
+        return
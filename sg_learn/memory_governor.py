@@ -0,0 +1,106 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import gc
+
+import torch
+
+from constants import Dvc
+from frontier import DepthFrontier
+from state_batch import StateBatch
+from utils import itp, processrss
+
+
+class MemoryGovernor:  # bytes held by the pools, gc only under pressure
+    def __init__(self, pp):
+        #
+        self.pp = pp
+        #
+        self.pools = {}  # name -> function returning the current pool
+        self.lastrss = processrss()
+        self.collections = 0
+        #
+
+    def register(self, name, getter):
+        self.pools[name] = getter
+        return
+
+    def unregister(self, name):
+        self.pools.pop(name, None)
+        return
+
+    def poolbytes(self, Pool):  # the storage, not only the rows in use
+        if Pool is None:
+            return 0
+        if isinstance(Pool, DepthFrontier):
+            return sum(
+                self.poolbytes(bucket) for bucket in Pool.buckets.values()
+            )
+        if isinstance(Pool, StateBatch):
+            if Pool.fields is None:
+                return 0
+            items = Pool.fields.values()
+        else:
+            items = [Pool[ky] for ky in Pool.keys() if ky != "length"]
+        return sum(
+            item.numel() * item.element_size()
+            for item in items
+            if torch.is_tensor(item)
+        )
+
+    def snapshot(self):  # cheap enough to log on every step
+        Snapshot = {}
+        for name in self.pools.keys():
+            Snapshot[name] = self.poolbytes(self.pools[name]())
+        Snapshot["pools"] = sum(Snapshot.values())
+        Snapshot["rss"] = processrss()
+        Snapshot["collections"] = self.collections
+        return Snapshot
+
+    def pressure(self, rss):
+        threshold = self.pp.gc_threshold
+        if threshold is None and self.pp.memory_budget is not None:
+            threshold = 0.8 * self.pp.memory_budget
+        if threshold is not None and rss > threshold:
+            return True
+        return rss > (1.0 + self.pp.gc_growth) * self.lastrss
+
+    def step(self):  # in place of a gc.collect() on every step
+        rss = processrss()
+        if not self.pressure(rss):
+            return False
+        gc.collect()
+        if Dvc.type == "cuda":
+            torch.cuda.empty_cache()
+        self.collections += 1
+        self.lastrss = processrss()
+        return True
+
+    def report(self):
+        Snapshot = self.snapshot()
+        print("memory:", end=" ")
+        for name in self.pools.keys():
+            print(name, itp(Snapshot[name]), end=" ")
+        print(
+            "pools",
+            itp(Snapshot["pools"]),
+            "rss",
+            itp(Snapshot["rss"]),
+            "collections",
+            itp(Snapshot["collections"]),
+        )
+        return
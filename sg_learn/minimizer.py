@@ -18,8 +18,6 @@
 #### next: the class used to prove the theoretical minimum (this is for alpha,beta = 3,2)
 #### note that the parameters and model should be initialized for (3,2)
 
-import gc
-
 import torch
 
 from constants import Dvc
@@ -184,7 +182,7 @@ class Minimizer:  # this becomes the first element of the relations datatype
         lower = 0
         for i in range(ndlength):
             assert lower < ndlength
-            upper = lower + 1000
+            upper = lower + self.rr3.MB.slicesize
             if upper > ndlength:
                 upper = ndlength
             detection[:] = False
@@ -254,9 +252,7 @@ class Minimizer:  # this becomes the first element of the relations datatype
         #
         new_fdlength = self.FullData["length"]
         #
-        self.FullData["info"][:, self.Pp.fulldata_location] = arangeic(
-            new_fdlength
-        )
+        self.FullData["location"] = arangeic(new_fdlength).to(torch.int32)
         #
         ##print("initialized full data that now has length",itp(new_fdlength))
         return
@@ -345,9 +341,7 @@ class Minimizer:  # this becomes the first element of the relations datatype
         #
         new_fdlength = self.FullData["length"]
         #
-        self.FullData["info"][:, self.Pp.fulldata_location] = arangeic(
-            new_fdlength
-        )
+        self.FullData["location"] = arangeic(new_fdlength).to(torch.int32)
         #
         ##print("added",itp(newactive_length),"new instances to full data that now has length",itp(new_fdlength))
         return
@@ -355,7 +349,7 @@ class Minimizer:  # this becomes the first element of the relations datatype
     def fd_location(self, Data):
         length = Data["length"]
         assert length > 0
-        return Data["info"][:, self.Pp.fulldata_location]
+        return Data["location"].to(torch.int64)
 
     def bounding_proofloop(self, Mstrat, fd_instances):
         #
@@ -416,7 +410,7 @@ class Minimizer:  # this becomes the first element of the relations datatype
                 ##print("at step",itp(stepcount),"currently proof nodes for fd instances in question are:")
                 ##print(nump(self.upperbound[fd_instances]))
                 #
-                gcc = gc.collect()
+                self.rr4.MG.step()
                 #
                 if ActivePool["length"] == 0:
                     break
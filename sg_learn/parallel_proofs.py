@@ -0,0 +1,188 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+
+from constants import CpuDvc, Dvc
+from driver import Driver
+from historical import Historical
+from utils import itp, numpr
+
+# the Driver and model of a worker process, set by initworker
+WorkerState: dict = {}
+
+
+def initworker(P, M, proof_nodes_max):
+    torch.set_num_threads(P.parallel_threads)
+    # several workers would write the same checkpoint file
+    P.checkpoint_dir = None
+    # the output of the workers would be interleaved
+    P.verbose = False
+    P.telemetry_print = False
+    HST = Historical(1000)
+    HST.proof_nodes_max = proof_nodes_max
+    WorkerState["driver"] = Driver(P, HST)
+    WorkerState["model"] = M
+    return
+
+
+def proofjob(instances):  # a full proof of the given sigma instances
+    Dd = WorkerState["driver"]
+    M = WorkerState["model"]
+    #
+    Dd.HST.reset_current_proof()
+    Dd.Cc.initialize()
+    instancevector = torch.tensor(instances, dtype=torch.int64, device=Dvc)
+    InitialData = Dd.initialdata(instancevector, 0)
+    _, ActivePool, _, prooflength = Dd.rr4.proofloop(
+        M, M, Dd.Cc, InitialData, 0
+    )
+    eqlist = Dd.Cc.eqlist
+    if eqlist is not None:
+        eqlist = eqlist.to(CpuDvc)
+    return {
+        "instances": instances,
+        "steps": prooflength + 1,
+        "remaining": int(ActivePool["length"]),
+        "donecount": int(Dd.rr4.donecount),
+        "ECN": float(Dd.rr4.ECN),
+        "eqlist": eqlist,
+        "eqlength": int(Dd.Cc.eqlength),
+        "valency_frequency": Dd.HST.current_proof_valency_frequency.to(
+            CpuDvc
+        ),
+        "impossible_count": int(Dd.HST.current_proof_impossible_count),
+        "done_count": int(Dd.HST.current_proof_done_count),
+        "passive_count": int(Dd.HST.current_proof_passive_count),
+        "benchmark": int(Dd.HST.current_proof_benchmark),
+    }
+
+
+class ParallelProof:  # full proofs of groups of sigma instances in workers
+    def __init__(self, Dd: Driver):
+        #
+        self.Dd = Dd
+        self.Pp = Dd.Pp
+        self.HST = Dd.HST
+        self.rr4 = Dd.rr4
+        #
+
+    def schedule(self, M, proving_instances):
+        # groups of parallel_group instances, the largest predicted first
+        InitialData = self.Dd.initialdata(proving_instances, 0)
+        # this also fills the root cache before the workers read it
+        ProcessedData, activedetect, _, _ = self.rr4.RC.processedroots(
+            InitialData
+        )
+        extent_log = self.rr4.rr3.IE.extentlog(M, ProcessedData)
+        # the roots that are already done or impossible go last
+        extent_log[~activedetect] = -1.0
+        _, order = torch.sort(extent_log, 0, descending=True)
+        ordered = proving_instances[order].tolist()
+        group = self.Pp.parallel_group
+        return [
+            ordered[lower : lower + group]
+            for lower in range(0, len(ordered), group)
+        ]
+
+    def classificationproof(self, Mstrat, proving_instances, title_text):
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        print("           parallel classification proof")
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        #
+        self.HST.title_text_sigma_proof = title_text
+        self.HST.reset_current_proof()
+        self.Dd.Cc.initialize()
+        #
+        jobs = self.schedule(Mstrat, proving_instances)
+        workers = self.Pp.parallel_workers
+        if workers is None:
+            workers = os.cpu_count()
+        if workers > len(jobs):
+            workers = len(jobs)
+        # the networks are read-only in the workers, in shared memory
+        if isinstance(Mstrat.network, nn.Module):
+            Mstrat.network.share_memory()
+        if isinstance(Mstrat.network2, nn.Module):
+            Mstrat.network2.share_memory()
+        #
+        steps = 0
+        remaining = 0
+        donecount = 0
+        ECN = 0.0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=initworker,
+            initargs=(self.Pp, Mstrat, self.HST.proof_nodes_max),
+        ) as executor:
+            futures = [executor.submit(proofjob, job) for job in jobs]
+            for future in as_completed(futures):
+                Result = future.result()
+                print(
+                    "sigma",
+                    Result["instances"],
+                    "done count",
+                    itp(Result["donecount"]),
+                    "cumulative nodes",
+                    numpr(Result["ECN"], 1),
+                )
+                steps += Result["steps"]
+                remaining += Result["remaining"]
+                donecount += Result["donecount"]
+                ECN += Result["ECN"]
+                if Result["eqlength"] > 0:
+                    self.Dd.Cc.addinstances(
+                        Result["eqlength"], Result["eqlist"].to(Dvc)
+                    )
+                self.HST.current_proof_valency_frequency += Result[
+                    "valency_frequency"
+                ].to(Dvc)
+                self.HST.current_proof_impossible_count += Result[
+                    "impossible_count"
+                ]
+                self.HST.current_proof_done_count += Result["done_count"]
+                self.HST.current_proof_passive_count += Result[
+                    "passive_count"
+                ]
+                self.HST.current_proof_benchmark += Result["benchmark"]
+        #
+        self.rr4.donecount = donecount
+        self.rr4.ECN = ECN
+        self.Dd.donecount_collection += self.rr4.donecount
+        self.Dd.ECN_collection += self.rr4.ECN
+        self.HST.record_full_proof(
+            Mstrat,
+            steps,
+            round(self.rr4.ECN),
+            self.rr4.donecount,
+        )
+        self.HST.record_current_proof(self.Pp, benchmark=Mstrat.benchmark)
+        #
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        if remaining > 0:
+            print("proofs left active nodes", itp(remaining))
+        print("proof has done count", itp(self.rr4.donecount), end=" ")
+        print("and estimated cumulative nodes", numpr(self.rr4.ECN, 1))
+        print("classifier eq pool has length", itp(self.Dd.Cc.eqlength))
+        print("---   ---   ---   ---   ---   ---   ---   ---   ---")
+        return
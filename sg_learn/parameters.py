@@ -83,12 +83,33 @@ class Parameters:  # records various parameters
         #
         self.profile_filter_on = True
         self.halfones_filter_on = True
+        # "matmul" for the batched matrix product steps, "index" for the
+        # original expanded index grids
+        self.propagation_backend = "matmul"
+        # after a cut, rerun the rules only where their inputs have changed
+        self.incremental_propagation = True
+        # in process, the converged rows are written back and dropped from
+        # the working batch once they are more than this fraction of it
+        self.fixpoint_compact_threshold = 0.5
+        # retire the rows with an empty prod column during the fixpoint, and
+        # with early_exit_filters also those caught by the other filters
+        self.early_exit = True
+        self.early_exit_filters = False
         #
         # for rr3:
         self.chunksize = (
             1000  # reduced this: for the 5,5 case 1000 led to memory overflow
         )
         self.chunksize_extra = 10
+        # bytes for the cache of propagated children, 0 to turn it off; it
+        # is used by dropout proofs and the learner, not by full proofs
+        self.memo_cache_bytes = 2 ** 27
+        # directory for the processed roots and left tables, None for no cache
+        self.root_cache_dir = None
+        # children are made and propagated this many at a time
+        self.slicesize = 1000
+        # in bytes; if set, chunksize and slicesize are tuned to stay under it
+        self.memory_budget = None
         self.exponent = 0.9
         self.chunkconstant = 300
         self.chunkextent = 10
@@ -103,6 +124,60 @@ class Parameters:  # records various parameters
         # for rr4:
         self.prooflooplength = 4000
         self.done_max = 30000
+        self.packed_pools = True  # keep active, done and sample pools packed
+        # merge identical active nodes, keeping count in their multiplicity
+        self.transposition_table = True
+        # keep the active pool as buckets by depth (see frontier.py)
+        self.depth_frontier = True
+        self.transposition_seed = 0
+        # in managesplit, replace the new active nodes by representatives
+        # under the stabilizer of their left table (see symmetry.py)
+        self.symmetry_reduction = False
+        # rows per network call in InferenceEngine.extentlog; with
+        # inference_bf16 the networks run under bfloat16 autocast on cpu and
+        # every inference_check_period calls the cuts are compared with fp32
+        self.inference_batch = 4096
+        self.inference_bf16 = False
+        self.inference_check_period = 50
+        # which nodes of the depth frontier are expanded next: "deepest"
+        # takes the chunk from the deepest end, "dfs" only from the deepest
+        # bucket and "minpeak" those of smallest predicted extent among the
+        # deepest; the latter two keep the active pool under frontier_bound
+        self.frontier_policy = "deepest"
+        self.frontier_bound = 50000
+        # nodes of the depth frontier held in memory beyond which the
+        # shallowest buckets go to segment files in spill_dir (see spill.py),
+        # None to keep everything in memory
+        self.spill_threshold = None
+        self.spill_dir = "spill"
+        # full proofs are saved there every checkpoint_steps steps or
+        # checkpoint_seconds seconds, None for no checkpoints
+        self.checkpoint_dir = None
+        self.checkpoint_steps = 50
+        self.checkpoint_seconds = 600
+        # for ParallelProof (see parallel_proofs.py): worker processes, None
+        # for one per cpu, sigma instances per job and threads per worker
+        self.parallel_workers = None
+        self.parallel_group = 1
+        self.parallel_threads = 1
+        # classify the done batches in a thread, with at most
+        # classifier_queue batches waiting (see async_classifier.py)
+        self.async_classifier = True
+        self.classifier_queue = 4
+        # gc.collect runs when the resident memory passes gc_threshold bytes
+        # (by default 0.8 memory_budget if that is set) or has grown by the
+        # fraction gc_growth since the last collection
+        self.gc_threshold = None
+        self.gc_growth = 0.25
+        # per-step events of proofloop go to this .jsonl or .csv file, None
+        # for no file; telemetry_print prints the progress dots and the end
+        # of proof mark from them
+        self.telemetry_path = None
+        self.telemetry_print = True
+        # random probes for Driver.estimateproof, and the normal quantile
+        # for its confidence interval
+        self.estimator_probes = 1000
+        self.estimator_z = 1.96
         #
         # self.sleeptime = 120  # use this on a laptop
         self.sleeptime = 0  # was 5
@@ -122,21 +197,6 @@ class Parameters:  # records various parameters
         self.dropout_style = "regular"
         #
         #
-        # info ranges   ###################
-        #
-        self.infosize = (
-            300  # currently we just need up to 250 for sample info stuff
-        )
-        #
-        self.samplepoints = 15
-        self.sampleinfolower = 50
-        self.sampleinfoupper = 250  # on ecrase vilower
-        #
-        self.fulldata_location = 25
-        self.phase = 12
-        #
-        ###################################
-        #
         self.basicloop_iterations = 3
         self.basicloop_training_iterations = 3
         #
@@ -18,7 +18,9 @@
 import torch
 
 from constants import Dvc
-from utils import arangeic, itt, nump, zbinary
+from frontier import DepthFrontier
+from state_batch import StateBatch
+from utils import arangeic, nump, zbinary
 
 
 class Relations1:
@@ -39,7 +41,6 @@ class Relations1:
         #
         self.ascore_max = self.pp.ascore_max
         #
-        self.infosize = self.pp.infosize
         self.pastsize = self.pp.pastsize
         self.futuresize = self.pp.futuresize
         #
@@ -100,6 +101,18 @@ class Relations1:
             self.betazsubsets[:, 0 : self.beta].to(torch.int).sum(1)
         )  # the size of the subset as a function of z
         #
+        # for the packed representation: prod columns become bitmasks over p
+        # (bz <= 7 so they fit in a uint8) and the 2-bit pairs of left, right
+        # and ternary are packed four to a byte
+        assert self.betaz <= 8
+        self.prodweights = 2 ** arangeic(self.betaz)
+        self.pairweights = 4 ** arangeic(4)
+        self.pairshifts = 2 * arangeic(4)
+        self.popcounttable = (
+            (arangeic(256).view(256, 1) >> arangeic(8).view(1, 8)) & 1
+        ).sum(1)
+        self.packedkeys = ["prod", "left", "right", "ternary"]
+        #
 
     ##### general manipulation of data
 
@@ -141,7 +154,7 @@ class Relations1:
         return subsets
 
     def nulldata(self):
-        length = torch.tensor(0)
+        length = 0
         Output = {
             "length": length,
             "depth": None,
@@ -149,15 +162,41 @@ class Relations1:
             "left": None,
             "right": None,
             "ternary": None,
-            "info": None,
+            "phase": None,
+            "location": None,
+            "ancestor": None,
+            "multiplicity": None,
+            "sigma": None,
         }
         return Output
 
+    def multiplicitysum(self, Data):  # the number of nodes Data stands for
+        if Data["length"] == 0:
+            return 0
+        if isinstance(Data, DepthFrontier):
+            return Data.multiplicity_total
+        return int(Data["multiplicity"].sum(0))
+
+    def newbatch(self, capacity=0):
+        return StateBatch(capacity)
+
+    def batchview(self, Batch):  # a Data dict of views, nulldata if empty
+        if Batch["length"] == 0:
+            return self.nulldata()
+        return Batch.view()
+
+    def batchdata(self, Data):  # copies Data into a new StateBatch
+        if isinstance(Data, StateBatch):
+            return Data
+        Batch = StateBatch(int(Data["length"]))
+        Batch.append(Data)
+        return Batch
+
     def copydata(self, Data):
         if Data["length"] == 0:
             return self.nulldata()
         Output = {}
-        Output["length"] = itt(Data["length"]).clone().detach()
+        Output["length"] = int(Data["length"])
         for ky in Data.keys():
             if ky != "length":
                 Output[ky] = (Data[ky]).clone().detach()
@@ -169,7 +208,7 @@ class Relations1:
         if Data["length"] == 0:
             return self.nulldata()
         Output = {}
-        Output["length"] = itt(Data["length"]).clone().detach()
+        Output["length"] = int(Data["length"])
         for ky in Data.keys():
             if ky != "length":
                 Output[ky] = Data[ky]
@@ -177,6 +216,9 @@ class Relations1:
 
     def deletedata(self, Data):
         # del Data['length']  # better avoid doing that
+        if isinstance(Data, StateBatch):
+            Data.clear()
+            return
         datakeyslist = list(Data.keys())
         for ky in datakeyslist:
             if ky != "length":
@@ -188,7 +230,15 @@ class Relations1:
         self, Data1, Data2
     ):  # appends Data2 to Data1 and outputs the result
         # there is a case where Data1 == None then we just output Data2
+        # if Data1 is a StateBatch then Data2 is appended to it in place
+        if isinstance(Data1, StateBatch):
+            if Data1.length > 0 and Data2["length"] > 0:
+                assert self.ispacked(Data1) == self.ispacked(Data2)
+            Data1.append(Data2)
+            return Data1
         assert set(Data1.keys()) == set(Data2.keys())
+        if Data1["length"] > 0 and Data2["length"] > 0:
+            assert self.ispacked(Data1) == self.ispacked(Data2)
         if Data1["length"] == 0:
             return self.copydata(Data2)
         if Data2["length"] == 0:
@@ -220,7 +270,8 @@ class Relations1:
         #
         assert len(detection) == Data["length"]
         #
-        sublength = detection.to(torch.int).sum(0)
+        # one count per mask, kept on the host
+        sublength = int(detection.to(torch.int64).sum(0))
         if sublength == 0:
             return self.nulldata()
         #
@@ -239,13 +290,15 @@ class Relations1:
         assert set(Data.keys()) == set(SubData.keys())
         #
         sublength = SubData["length"]
+        if sublength > 0:
+            assert self.ispacked(Data) == self.ispacked(SubData)
         assert detection.to(torch.int).sum(0) == sublength
         #
         if sublength == 0:
             return Data
         #
         Output = {}
-        Output["length"] = itt(Data["length"])
+        Output["length"] = int(Data["length"])
         #
         for ky in Data.keys():
             if ky != "length":
@@ -255,6 +308,104 @@ class Relations1:
         #
         return Output
 
+    ##### packed representation of the state tensors
+
+    def ispacked(self, Data):
+        if Data["length"] == 0:
+            return False
+        return Data["prod"].dtype == torch.uint8
+
+    def packpairs(self, pairs, n):  # pairs of shape length.n.2 to bytes
+        length = pairs.size(0)
+        n4 = (n + 3) // 4
+        codes = torch.zeros((length, 4 * n4), dtype=torch.int64, device=Dvc)
+        bit0 = pairs[:, :, 0].to(torch.int64)
+        bit1 = pairs[:, :, 1].to(torch.int64)
+        codes[:, 0:n] = bit0 + 2 * bit1
+        packed = (codes.view(length, n4, 4) * self.pairweights).sum(2)
+        return packed.to(torch.uint8)
+
+    def unpackpairs(self, packed, n):  # bytes to pairs of shape length.n.2
+        length = packed.size(0)
+        n4 = packed.size(1)
+        codes = (
+            (packed.to(torch.int64).view(length, n4, 1) >> self.pairshifts)
+            & 3
+        ).view(length, 4 * n4)[:, 0:n]
+        pairs = torch.stack(((codes & 1) != 0, (codes & 2) != 0), 2)
+        return pairs
+
+    def packprod(self, prod):
+        packed = (prod.to(torch.int64) * self.prodweights).sum(3)
+        return packed.to(torch.uint8)
+
+    def unpackprod(self, packed):
+        length = packed.size(0)
+        a = self.alpha
+        bz = self.betaz
+        prod = (
+            packed.to(torch.int64).view(length, a, a, 1) & self.prodweights
+        ) != 0
+        return prod
+
+    def packdata(self, Data):  # the other fields are kept as they are
+        #
+        if Data["length"] == 0 or self.ispacked(Data):
+            return Data
+        #
+        a = self.alpha
+        a3 = self.alpha3
+        bz = self.betaz
+        length = Data["length"]
+        #
+        Output = {}
+        for ky in Data.keys():
+            if ky not in self.packedkeys:
+                Output[ky] = Data[ky]
+        Output["prod"] = self.packprod(Data["prod"])
+        Output["left"] = self.packpairs(
+            Data["left"].reshape(length, a * bz, 2), a * bz
+        )
+        Output["right"] = self.packpairs(
+            Data["right"].reshape(length, bz * a, 2), bz * a
+        )
+        Output["ternary"] = self.packpairs(
+            Data["ternary"].reshape(length, a3, 2), a3
+        )
+        return Output
+
+    def unpackdata(self, Data):
+        #
+        if not self.ispacked(Data):
+            return Data
+        #
+        a = self.alpha
+        a3 = self.alpha3
+        bz = self.betaz
+        length = Data["length"]
+        #
+        Output = {}
+        for ky in Data.keys():
+            if ky not in self.packedkeys:
+                Output[ky] = Data[ky]
+        Output["prod"] = self.unpackprod(Data["prod"])
+        Output["left"] = self.unpackpairs(Data["left"], a * bz).view(
+            length, a, bz, 2
+        )
+        Output["right"] = self.unpackpairs(Data["right"], bz * a).view(
+            length, bz, a, 2
+        )
+        Output["ternary"] = self.unpackpairs(Data["ternary"], a3).view(
+            length, a, a, a, 2
+        )
+        return Output
+
+    def prodcount(self, Data):  # number of possible p in each column x,y
+        prod = Data["prod"]
+        if self.ispacked(Data):
+            return self.popcounttable[prod.to(torch.int64)]
+        return prod.to(torch.int64).sum(3)
+
     #########################
 
     def filterpossible(
@@ -347,7 +498,7 @@ class Relations1:
         bz = self.betaz
         #
         if len(ivector) == 0:
-            return self.rr1.nulldata()
+            return self.nulldata()
         #
         UpData = self.indexselectdata(Data, ivector)
         length = UpData["length"]
@@ -371,3 +522,22 @@ class Relations1:
         UpData["depth"] += 1
         #
         return UpData
+
+    def splitslices(
+        self, Data, ivector, xvector, yvector, pvector, slicesize
+    ):  # upsplitting one slice at a time, yields lower, upper, SliceData
+        ndlength = len(ivector)
+        lower = 0
+        while lower < ndlength:
+            upper = lower + slicesize
+            if upper > ndlength:
+                upper = ndlength
+            SliceData = self.upsplitting(
+                Data,
+                ivector[lower:upper],
+                xvector[lower:upper],
+                yvector[lower:upper],
+                pvector[lower:upper],
+            )
+            yield lower, upper, SliceData
+            lower = upper
@@ -15,10 +15,13 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import time
+
 import torch
 
+from constants import Dvc
 from relations_1 import Relations1
-from utils import arangeic, composedetections
+from utils import arangeic
 
 
 class Relations2:
@@ -40,6 +43,29 @@ class Relations2:
         self.halfones_count = 0
         self.impossible_basic_count = 0
         #
+        # rows retired as impossible in the middle of the fixpoint, and the
+        # row-iterations done by the rest of their batch after that
+        self.early_exit_rows = 0
+        self.early_exit_iterations = 0
+        #
+        # seconds spent in processcut, less the filters, and in the filters
+        self.timings = {"propagation": 0.0, "filter": 0.0}
+        #
+
+    def resetearlyexit(self):
+        self.early_exit_rows = 0
+        self.early_exit_iterations = 0
+        return
+
+    def earlydetect(self, Data, prodstats):
+        # rows that can already be seen to be impossible during the fixpoint
+        detection = ((prodstats == 0).any(2)).any(1)
+        if self.pp.early_exit_filters:
+            _, _, impossibledetect, _ = self.filterfused(
+                Data, prodstats, counting=False
+            )
+            detection = detection | impossibledetect
+        return detection
 
     def filterpossible(
         self, Data
@@ -217,9 +243,178 @@ class Relations2:
         #
         return NewData
 
-    def process(self, Data):
+    ##### the same three steps with broadcast views and batched matrix
+    ##### products instead of expanded index grids, the output is identical
+
+    def boolbmm(self, m1, m2):  # any over the inner index of m1[i] & m2[i]
+        product = torch.bmm(m1.to(torch.float), m2.to(torch.float))
+        return product > 0.5
+
+    def modifyternaryStepMatmul(self, Data):
+        #
+        a = self.alpha
+        a2 = self.alpha2
+        bz = self.betaz
+        #
+        length = Data["length"]
+        prod = Data["prod"]
+        left = Data["left"]
+        right = Data["right"]
+        ternary = Data["ternary"]
+        #
+        prodv = prod.reshape(length, a2, bz)
+        #
+        # nter_left[x,y,z,k] = any over p of prod[y,z,p] & left[x,p,k]
+        leftv = left.permute(0, 2, 1, 3).reshape(length, bz, a * 2)
+        nter_left = (
+            self.boolbmm(prodv, leftv)
+            .view(length, a, a, a, 2)
+            .permute(0, 3, 1, 2, 4)
+        )
+        # nter_right[x,y,z,k] = any over p of prod[x,y,p] & right[p,z,k]
+        rightv = right.reshape(length, bz, a * 2)
+        nter_right = self.boolbmm(prodv, rightv).view(length, a, a, a, 2)
+        #
+        newternary = ternary & nter_left & nter_right
+        #
+        NewData = self.rr1.duplicatedata(Data)
+        NewData["ternary"] = newternary.detach()
+        #
+        return NewData
+
+    def modifyleftrightStepMatmul(self, Data):
+        #
+        a = self.alpha
+        a2 = self.alpha2
+        bz = self.betaz
+        #
+        length = Data["length"]
+        prod = Data["prod"]
+        left = Data["left"]
+        right = Data["right"]
+        ternary = Data["ternary"]
+        #
+        prodstats = prod.to(torch.int64).sum(3)
+        unique = (prodstats == 1).view(length, a, a, 1)
+        produnique = (prod & unique).reshape(length, a2, bz)
+        notternary = ~ternary
+        #
+        # a left value x.p = k is excluded if some unique y.z = p has
+        # x.y.z != k, and similarly on the right
+        notternary_left = notternary.permute(0, 4, 1, 2, 3).reshape(
+            length, 2 * a, a2
+        )
+        violation_left = self.boolbmm(notternary_left, produnique).view(
+            length, 2, a, bz
+        )
+        notternary_right = notternary.permute(0, 4, 3, 1, 2).reshape(
+            length, 2 * a, a2
+        )
+        violation_right = self.boolbmm(notternary_right, produnique).view(
+            length, 2, a, bz
+        )
+        #
+        newleft = left & (~violation_left).permute(0, 2, 3, 1)
+        newright = right & (~violation_right).permute(0, 3, 2, 1)
+        #
+        NewData = self.rr1.duplicatedata(Data)
+        NewData["left"] = newleft.detach()
+        NewData["right"] = newright.detach()
+        #
+        return NewData
+
+    def modifyprodStepMatmul(self, Data):
+        #
+        a = self.alpha
+        a2 = self.alpha2
+        bz = self.betaz
+        #
+        length = Data["length"]
+        prod = Data["prod"]
+        left = Data["left"]
+        right = Data["right"]
+        ternary = Data["ternary"]
+        #
+        notternary = ~ternary
+        # the inner index pairs ternary bit k with the opposite bit of left
+        # (or right), so that one product covers both excluded cases
+        notleft_flip = (~left).flip(3).permute(0, 3, 1, 2).reshape(
+            length, 2 * a, bz
+        )
+        notright_flip = (~right).flip(3).permute(0, 3, 2, 1).reshape(
+            length, 2 * a, bz
+        )
+        #
+        notternary_x = notternary.permute(0, 2, 3, 4, 1).reshape(
+            length, a2, 2 * a
+        )
+        violation_left = self.boolbmm(notternary_x, notleft_flip).view(
+            length, a, a, bz
+        )
+        notternary_z = notternary.permute(0, 1, 2, 4, 3).reshape(
+            length, a2, 2 * a
+        )
+        violation_right = self.boolbmm(notternary_z, notright_flip).view(
+            length, a, a, bz
+        )
+        #
+        newprod = prod & (~violation_left) & (~violation_right)
+        #
+        NewData = self.rr1.duplicatedata(Data)
+        NewData["prod"] = newprod.detach()
+        #
+        return NewData
+
+    def ternarystep(self, Data):
+        if self.pp.propagation_backend == "matmul":
+            return self.modifyternaryStepMatmul(Data)
+        return self.modifyternaryStep(Data)
+
+    def leftrightstep(self, Data):
+        if self.pp.propagation_backend == "matmul":
+            return self.modifyleftrightStepMatmul(Data)
+        return self.modifyleftrightStep(Data)
+
+    def prodstep(self, Data):
+        if self.pp.propagation_backend == "matmul":
+            return self.modifyprodStepMatmul(Data)
+        return self.modifyprodStep(Data)
+
+    def propagationstep(self, Data):  # ternary, then left-right, then prod
+        NewData = self.ternarystep(Data)
+        NewData = self.leftrightstep(NewData)
+        NewData = self.prodstep(NewData)
+        return NewData
+
+    def writeback(self, OutputData, rows, WorkData, detection=None):
+        # copies the rows of the working batch into their places in OutputData
+        if detection is not None:
+            rows = rows[detection]
+        if len(rows) == 0:
+            return
+        for ky in WorkData.keys():
+            if ky != "length":
+                if detection is None:
+                    OutputData[ky][rows] = WorkData[ky]
+                else:
+                    OutputData[ky][rows] = WorkData[ky][detection]
+        return
+
+    def knowledgestats(self, Data, prodstats):  # same as rr1.knowledge
+        length = Data["length"]
+        output = -prodstats.reshape(length, -1).sum(1)
+        output -= Data["left"].to(torch.int64).reshape(length, -1).sum(1)
+        output -= Data["right"].to(torch.int64).reshape(length, -1).sum(1)
+        output -= Data["ternary"].to(torch.int64).reshape(length, -1).sum(1)
+        return output
+
+    def process(self, Data, withfilters=False):
+        # with withfilters it also returns the output of filterfused, using
+        # the prod statistics of the last iteration
         length = Data["length"]
         if length == 0:
+            if withfilters:
+                return Data, self.filterfused(Data)
             return Data
         #
         #
@@ -227,33 +422,186 @@ class Relations2:
         nprod = Data["prod"]
         nprodstats = nprod.to(torch.int64).sum(3)
         subset = ((nprodstats > 0).all(2)).all(1)
-        NextData = self.rr1.detectsubdata(Data, subset)
-        if subset.to(torch.int).sum(0) == 0:
+        if not subset.any(0):
+            if withfilters:
+                return OutputData, self.filterfused(OutputData, nprodstats)
             return OutputData
+        #
+        # one working batch, with rows giving the places of its rows in
+        # OutputData; a row whose knowledge stopped changing is at its
+        # fixpoint so further steps leave it alone, and the converged rows
+        # are only written back and removed once they are numerous enough;
+        # the impossible rows are written back and removed right away
+        rows = arangeic(length)[subset]
+        WorkData = self.rr1.detectsubdata(Data, subset)
+        workprodstats = nprodstats[subset]
+        unconverged = torch.ones((len(rows)), dtype=torch.bool, device=Dvc)
+        priorknowledge = self.knowledgestats(WorkData, workprodstats)
+        retiredcount = 0
         for i in range(1000):
-            priorknowledge = self.rr1.knowledge(NextData)
             #
+            WorkData = self.propagationstep(WorkData)
+            # the steps saved by the rows that have left the working batch
+            self.early_exit_iterations += retiredcount
+            #
+            workprodstats = WorkData["prod"].to(torch.int64).sum(3)
+            nextknowledge = self.knowledgestats(WorkData, workprodstats)
+            unconverged = unconverged & (priorknowledge < nextknowledge)
+            priorknowledge = nextknowledge
+            #
+            if self.pp.early_exit:
+                early = unconverged & self.earlydetect(WorkData, workprodstats)
+                earlycount = int(early.to(torch.int64).sum(0))
+                if earlycount > 0:
+                    self.writeback(OutputData, rows, WorkData, early)
+                    nprodstats[rows[early]] = workprodstats[early]
+                    kept = ~early
+                    rows = rows[kept]
+                    WorkData = self.rr1.detectsubdata(WorkData, kept)
+                    workprodstats = workprodstats[kept]
+                    priorknowledge = priorknowledge[kept]
+                    unconverged = unconverged[kept]
+                    retiredcount += earlycount
+                    self.early_exit_rows += earlycount
             #
-            NextData = self.modifyternaryStep(NextData)
+            remaining = int(unconverged.to(torch.int64).sum(0))
+            if remaining == 0:
+                break
+            worklength = len(rows)
+            if remaining <= (1.0 - self.pp.fixpoint_compact_threshold) * (
+                worklength
+            ):
+                self.writeback(OutputData, rows, WorkData, ~unconverged)
+                nprodstats[rows[~unconverged]] = workprodstats[~unconverged]
+                rows = rows[unconverged]
+                WorkData = self.rr1.detectsubdata(WorkData, unconverged)
+                workprodstats = workprodstats[unconverged]
+                priorknowledge = priorknowledge[unconverged]
+                unconverged = unconverged[unconverged]
+        #
+        self.writeback(OutputData, rows, WorkData)
+        if withfilters:
+            nprodstats[rows] = workprodstats
+            return OutputData, self.filterfused(OutputData, nprodstats)
+        return OutputData
+
+    ##### incremental propagation after a single cut
+
+    def rowschanged(self, new, old):
+        length = new.size(0)
+        return (new != old).reshape(length, -1).any(1)
+
+    def processIncremental(self, Data, xvector, yvector, withfilters=False):
+        # Data are children of fully propagated parents that differ from them
+        # only by the cut x.y = p in prod. Each rule is rerun only on the rows
+        # where one of the fields it reads has changed since it last ran
+        # (ternary reads prod, left, right; left-right reads prod, ternary;
+        # prod reads left, right, ternary). On the rows that don't become
+        # impossible this gives the same fixpoint as process.
+        #
+        bz = self.betaz
+        #
+        length = Data["length"]
+        if length == 0:
+            if withfilters:
+                return Data, self.filterfused(Data)
+            return Data
+        #
+        OutputData = self.rr1.copydata(Data)
+        prod = OutputData["prod"]
+        left = OutputData["left"]
+        right = OutputData["right"]
+        ternary = OutputData["ternary"]
+        #
+        irange = arangeic(length)
+        #
+        # the first ternary step only touches the cells x.(x0.y0), (x0.y0).z
+        cutcolumn = prod[irange, xvector, yvector]
+        nter_left = (cutcolumn.view(length, 1, bz, 1) & left).any(2)
+        nter_right = (cutcolumn.view(length, bz, 1, 1) & right).any(1)
+        ternary[irange, :, xvector, yvector] = (
+            ternary[irange, :, xvector, yvector] & nter_left
+        )
+        ternary[irange, xvector, yvector] = (
+            ternary[irange, xvector, yvector] & nter_right
+        )
+        changedternary = self.rowschanged(ternary, Data["ternary"])
+        #
+        pendingT = torch.zeros((length), dtype=torch.bool, device=Dvc)
+        pendingLR = torch.ones((length), dtype=torch.bool, device=Dvc)
+        pendingP = changedternary.clone()
+        retiredcount = 0
+        #
+        for i in range(1000):
+            self.early_exit_iterations += retiredcount
             #
-            NextData = self.modifyleftrightStep(NextData)
+            rows = irange[pendingLR]
+            if len(rows) > 0:
+                SubData = self.rr1.indexselectdata(OutputData, rows)
+                NewSubData = self.leftrightstep(SubData)
+                changed = self.rowschanged(
+                    NewSubData["left"], SubData["left"]
+                ) | self.rowschanged(NewSubData["right"], SubData["right"])
+                left[rows] = NewSubData["left"]
+                right[rows] = NewSubData["right"]
+                pendingLR[rows] = False
+                pendingT[rows[changed]] = True
+                pendingP[rows[changed]] = True
             #
-            NextData = self.modifyprodStep(NextData)
+            rows = irange[pendingP]
+            if len(rows) > 0:
+                SubData = self.rr1.indexselectdata(OutputData, rows)
+                NewSubData = self.prodstep(SubData)
+                changed = self.rowschanged(NewSubData["prod"], SubData["prod"])
+                prod[rows] = NewSubData["prod"]
+                pendingP[rows] = False
+                pendingT[rows[changed]] = True
+                pendingLR[rows[changed]] = True
+                #
+                # only this step changes prod, so the rows where a column
+                # has emptied are found here and retired
+                if self.pp.early_exit:
+                    emptied = ((~NewSubData["prod"].any(3)).any(2)).any(1)
+                    early = rows[changed & emptied]
+                    if len(early) > 0:
+                        pendingT[early] = False
+                        pendingLR[early] = False
+                        retiredcount += len(early)
+                        self.early_exit_rows += len(early)
             #
-            nextknowledge = self.rr1.knowledge(NextData)
-            nextdonedetect = priorknowledge >= nextknowledge
-            subset_nextdone = composedetections(length, subset, nextdonedetect)
-            NextDoneData = self.rr1.detectsubdata(NextData, nextdonedetect)
-            OutputData = self.rr1.insertdata(
-                OutputData, subset_nextdone, NextDoneData
-            )
+            rows = irange[pendingT]
+            if len(rows) > 0:
+                SubData = self.rr1.indexselectdata(OutputData, rows)
+                NewSubData = self.ternarystep(SubData)
+                changed = self.rowschanged(
+                    NewSubData["ternary"], SubData["ternary"]
+                )
+                ternary[rows] = NewSubData["ternary"]
+                pendingT[rows] = False
+                pendingLR[rows[changed]] = True
+                pendingP[rows[changed]] = True
             #
-            subset = subset & (~subset_nextdone)
-            if subset.to(torch.int).sum(0) == 0:
+            if not (pendingT | pendingLR | pendingP).any(0):
                 break
-            NextData = self.rr1.detectsubdata(NextData, ~nextdonedetect)
+        #
+        if withfilters:
+            return OutputData, self.filterfused(OutputData)
         return OutputData
 
+    def processcut(self, Data, xvector, yvector, withfilters=False):
+        start = time.perf_counter()
+        filtertime = self.timings["filter"]
+        if self.pp.incremental_propagation:
+            Output = self.processIncremental(
+                Data, xvector, yvector, withfilters
+            )
+        else:
+            Output = self.process(Data, withfilters)
+        self.timings["propagation"] += (
+            time.perf_counter() - start - (self.timings["filter"] - filtertime)
+        )
+        return Output
+
     def impossibleFilter(self, Data):
         a = self.alpha
         a2 = self.alpha2
@@ -376,28 +724,117 @@ class Relations2:
         #
         return detection
 
-    def filterdata(self, Data):  #
+    def filterfused(
+        self, Data, prodstats=None, counting=True, allcodes=False
+    ):
+        # does impossibleFilter, profileFilter, halfonesFilter and doneFilter
+        # in one pass, sharing the statistics; hitcode has the bits
+        # 1 impossible, 2 profile, 4 halfones, 8 done (before the other
+        # filters); with allcodes the halfones bit is there whatever the
+        # flags, for codes kept across changes of the flags
+        a = self.alpha
+        a3 = self.alpha3
+        bz = self.betaz
+        #
+        length = Data["length"]
+        if length == 0:
+            nodetect = torch.zeros((0), dtype=torch.bool, device=Dvc)
+            nocode = torch.zeros((0), dtype=torch.int8, device=Dvc)
+            return nodetect, nodetect, nodetect, nocode
+        start = time.perf_counter()
+        #
+        prod = Data["prod"]
+        left = Data["left"]
+        right = Data["right"]
+        ternary = Data["ternary"]
         #
+        if prodstats is None:
+            prodstats = prod.to(torch.int64).sum(3)
+        leftstats = left.to(torch.int64).sum(3)
+        rightstats = right.to(torch.int64).sum(3)
+        ternarystats = ternary.view(length, a3, 2).to(torch.int64).sum(2)
         #
-        impossibledetect = self.impossibleFilter(Data)
-        profiledetect = self.profileFilter(Data)
+        basicdetect = (
+            ((prodstats == 0).any(2)).any(1)
+            | ((leftstats == 0).any(2)).any(1)
+            | ((rightstats == 0).any(2)).any(1)
+            | (ternarystats == 0).any(1)
+        )
         #
+        # two defined columns p != q with the same profile: the profiles are
+        # made into integer keys, undefined ones get distinct negative keys,
+        # and equal keys are found by sorting
+        profile_def = ((leftstats == 1).all(1)) & ((rightstats == 1).all(2))
+        profile = torch.cat(
+            ((left[:, :, :, 0]).permute(0, 2, 1), right[:, :, :, 0]), 2
+        )
+        profileweights = 2 ** arangeic(2 * a)
+        profilekey = (profile.to(torch.int64) * profileweights).sum(2)
+        undefinedkey = -1 - arangeic(bz).view(1, bz).expand(length, bz)
+        profilekey = torch.where(profile_def, profilekey, undefinedkey)
+        sortedkey, _ = profilekey.sort(1)
+        profiledetect = (sortedkey[:, 1:] == sortedkey[:, :-1]).any(1)
+        #
+        impossibledetect = basicdetect
         if self.pp.profile_filter_on:
             impossibledetect = impossibledetect | profiledetect
         #
-        self.impossible_basic_count += impossibledetect.to(torch.int64).sum(0)
+        if counting:
+            self.impossible_basic_count += impossibledetect.to(
+                torch.int64
+            ).sum(0)
+        #
+        hitcode = basicdetect.to(torch.int8) + 2 * profiledetect.to(torch.int8)
         # experimental:
+        if self.pp.halfones_filter_on or allcodes:
+            assert (((leftstats <= 1).all(2)).all(1)).all(0)
+            leftones = (left[:, :, :, 1].to(torch.int64).sum(2)).sum(1)
+            right_isone = (rightstats == 1) & right[:, :, :, 1]
+            rightones = (right_isone.to(torch.int64).sum(2)).sum(1)
+            halfonesdetect = rightones > leftones
+            hitcode += 4 * halfonesdetect.to(torch.int8)
         if self.pp.halfones_filter_on:
-            halfonesdetect = self.halfonesFilter(Data)
-            self.halfones_count += (
-                (halfonesdetect & (~impossibledetect)).to(torch.int64).sum(0)
-            )
+            if counting:
+                self.halfones_count += (
+                    (halfonesdetect & (~impossibledetect))
+                    .to(torch.int64)
+                    .sum(0)
+                )
             #
             impossibledetect = impossibledetect | halfonesdetect
         #
-        donedetect = self.doneFilter(Data)
+        donedetect = ((prodstats == 1).all(2)).all(1)
+        hitcode += 8 * donedetect.to(torch.int8)
         donedetect = donedetect & (~impossibledetect)
         #
         activedetect = (~impossibledetect) & ~donedetect
         #
+        self.timings["filter"] += time.perf_counter() - start
+        return activedetect, donedetect, impossibledetect, hitcode
+
+    def countfilters(self, hitcode):  # the counters, from filterfused codes
+        basicdetect = (hitcode & 1) != 0
+        impossibledetect = basicdetect
+        if self.pp.profile_filter_on:
+            impossibledetect = impossibledetect | ((hitcode & 2) != 0)
+        self.impossible_basic_count += impossibledetect.to(torch.int64).sum(0)
+        if self.pp.halfones_filter_on:
+            halfonesdetect = (hitcode & 4) != 0
+            self.halfones_count += (
+                (halfonesdetect & (~impossibledetect)).to(torch.int64).sum(0)
+            )
+        return
+
+    def filtersfromcode(self, hitcode):
+        impossibledetect = (hitcode & 1) != 0
+        if self.pp.profile_filter_on:
+            impossibledetect = impossibledetect | ((hitcode & 2) != 0)
+        if self.pp.halfones_filter_on:
+            impossibledetect = impossibledetect | ((hitcode & 4) != 0)
+        donedetect = ((hitcode & 8) != 0) & (~impossibledetect)
+        activedetect = (~impossibledetect) & ~donedetect
+        return activedetect, donedetect, impossibledetect
+
+    def filterdata(self, Data):  #
+        activedetect, donedetect, impossibledetect, _ = self.filterfused(Data)
         return activedetect, donedetect, impossibledetect
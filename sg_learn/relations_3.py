@@ -18,9 +18,15 @@
 import torch
 
 from constants import Dvc
+from frontier import DepthFrontier
 from historical import Historical
+from inference_engine import InferenceEngine
+from memo_cache import MemoCache
+from memory_budget import MemoryBudget
+from symmetry import SymmetryReduction
+from transposition import TranspositionTable
 from relations_2 import Relations2
-from utils import arangeic, itp, nump
+from utils import CoherenceError, arangeic, itp, nump
 
 
 class Relations3:
@@ -40,6 +46,16 @@ class Relations3:
         self.betaz = self.beta + 1
         self.HST = HST
         #
+        self.MB = MemoryBudget(pp)
+        self.TT = TranspositionTable(pp, self.rr1)
+        self.SR = SymmetryReduction(pp, self.rr1, self.MB)
+        self.MC = MemoCache(pp, self.rr2)
+        self.IE = InferenceEngine(pp, self.rr1)
+        # the sizes seen by the last managesplit, for the telemetry
+        self.stepcounts = {"children": 0, "done": 0, "impossible": 0}
+        # merging nodes only preserves the counts of a full proof
+        self.merging = True
+        #
 
     def printmultiplicities(self, Data):
         #
@@ -70,30 +86,96 @@ class Relations3:
         print(nump(multiplicities))
         return
 
-    def selectchunk(self, Data):
+    def boundedchunk(self, Frontier):
+        # each expanded node is replaced by about MB.survivors new ones, so
+        # the chunk is cut down to keep the frontier under frontier_bound
+        chunksize = self.MB.chunksize
+        growth = self.MB.survivors - 1.0
+        if growth <= 0.0:
+            return chunksize
+        room = self.pp.frontier_bound - Frontier.length
+        amount = int(room / growth)
+        if amount < 1:
+            amount = 1
+        if amount > chunksize:
+            amount = chunksize
+        return amount
+
+    def minpeakchunk(self, M, Frontier, amount):
+        # among the deepest candidates, the nodes expected to close soonest
+        Candidates = Frontier.pop(4 * amount)
+        length = Candidates["length"]
+        if length <= amount:
+            return Candidates
+        extent_log = self.IE.extentlog(M, Candidates)
+        _, order = torch.sort(extent_log, 0)
+        Frontier.push(self.rr1.indexselectdata(Candidates, order[amount:]))
+        return self.rr1.indexselectdata(Candidates, order[0:amount])
+
+    def selectchunkfrontier(self, Frontier, M=None):
+        # the chosen nodes are taken out of the frontier right away
+        assert Frontier["length"] > 0
+        #
+        depths = Frontier.depths()
+        if len(depths) > 0:
+            self.MB.tune(Frontier.bucket(depths[0]))
+        else:
+            self.MB.tune({"length": 0})
+        #
+        policy = self.pp.frontier_policy
+        if policy == "deepest":
+            PoolChunk = Frontier.pop(self.MB.chunksize)
+        elif policy == "dfs":
+            PoolChunk = Frontier.popdeepest(self.boundedchunk(Frontier))
+        elif policy == "minpeak":
+            if M is None:
+                raise CoherenceError("minpeak policy needs a model")
+            PoolChunk = self.minpeakchunk(
+                M, Frontier, self.boundedchunk(Frontier)
+            )
+        else:
+            raise CoherenceError("unsupported frontier_policy")
+        ChunkData = self.rr1.unpackdata(PoolChunk)
+        #
+        prodstats = ChunkData["prod"].to(torch.int64).sum(3)
+        assert (((prodstats > 0).all(2)).all(1)).all(0)
+        optional = prodstats > 1
+        assert ((optional.any(2)).any(1)).all(0)
+        #
+        if self.pp.verbose:
+            print("active pool rows by depth:", Frontier.rowcounts())
+        #
+        return ChunkData, None
+
+    def selectchunk(self, Data, M=None):
+        #
+        if isinstance(Data, DepthFrontier):
+            return self.selectchunkfrontier(Data, M)
         #
         length = Data["length"]
         depth = Data["depth"]
-        prod = Data["prod"]
         #
         #
         assert length > 0
         #
-        prodstats = prod.to(torch.int).sum(3)
+        self.MB.tune(Data)
+        #
+        prodstats = self.rr1.prodcount(Data)
         assert (((prodstats > 0).all(2)).all(1)).all(0)
         optional = prodstats > 1
         assert ((optional.any(2)).any(1)).all(0)
         #
         values, indices = torch.sort(depth, 0, descending=True)
         upper = length
-        if upper > self.pp.chunksize:
-            upper = self.pp.chunksize
+        if upper > self.MB.chunksize:
+            upper = self.MB.chunksize
         indices_upper = indices[0:upper]
         #
         cdetection = torch.zeros((length), dtype=torch.bool, device=Dvc)
         cdetection[indices_upper] = True
         #
         ChunkData = self.rr1.detectsubdata(Data, cdetection)
+        ChunkData = self.rr1.unpackdata(ChunkData)
         #
         if self.pp.verbose:
             self.printmultiplicities(Data)
@@ -122,7 +204,16 @@ class Relations3:
         #
         availablexyr = self.rr1.availablexy(length, prod).reshape(length * a2)
         #
-        networkscorer = M.network2(Data).detach().reshape(length * a2)
+        networkscorer = self.IE.network2(M, Data).reshape(length * a2)
+        #
+        if self.IE.checkdue():
+            exactscorer = self.IE.network2(M, Data, exact=True)
+            self.IE.agreement(
+                self.choosecuts(length, networkscorer, availablexyr),
+                self.choosecuts(
+                    length, exactscorer.reshape(length * a2), availablexyr
+                ),
+            )
         #
         if randomize:
             #
@@ -136,7 +227,7 @@ class Relations3:
             epsilon = torch.rand(length * a2, device=Dvc)
             networkscorer += epsilon_factor * epsilon
             #
-            phase = Data["info"][:, self.pp.phase]
+            phase = Data["phase"]
             tirage = torch.rand(length, device=Dvc)
             detection = (phase == 1) | ((tirage < 0.1) & (phase == 2))
             detectionvxr = (
@@ -148,6 +239,11 @@ class Relations3:
             networkscorer[detectionvxr] = randomscore[detectionvxr]
             #
         #
+        return self.choosecuts(length, networkscorer, availablexyr)
+
+    def choosecuts(self, length, networkscorer, availablexyr):
+        a2 = self.alpha2
+        #
         networkscorer = torch.clamp(networkscorer, -1.0, 10.0)
         networkscorer[~availablexyr] = 20.0
         networkscore = networkscorer.view(length, a2)
@@ -157,9 +253,9 @@ class Relations3:
         return xyvector
 
     def addvalencies(
-        self, availablexyp, xyvector
+        self, availablexyp, xyvector, multiplicity
     ):  # adds into the HST file the valencies of these vertices
-        # also adds the passive count (just the length of the xyvector)
+        # also adds the passive count, each node weighted by its multiplicity
         #
         a = self.alpha
         a2 = self.alpha2
@@ -170,16 +266,16 @@ class Relations3:
         bz = self.betaz
         #
         length = len(xyvector)
-        self.HST.current_proof_passive_count += length
+        self.HST.current_proof_passive_count += multiplicity.sum(0)
         #
         availablexypv = availablexyp.view(length, a2, bz)
         lrange = arangeic(length)
         available_cuts = availablexypv[lrange, xyvector]
         valency = available_cuts.to(torch.int64).sum(1)
         for v in range(bz + 1):
-            self.HST.current_proof_valency_frequency[v] += (
-                (valency == v).to(torch.int64).sum(0)
-            )
+            self.HST.current_proof_valency_frequency[v] += multiplicity[
+                valency == v
+            ].sum(0)
         return
 
     def managesplit(self, M, DataToSplit, randomize):
@@ -200,7 +296,9 @@ class Relations3:
         #
         xyvector = self.network_vcuts(M, DataToSplit, randomize)
         #
-        self.addvalencies(availablexyp, xyvector)
+        self.addvalencies(
+            availablexyp, xyvector, DataToSplit["multiplicity"]
+        )
         #
         lrangevxr = (
             arangeic(length)
@@ -228,65 +326,105 @@ class Relations3:
         xvector_vert = prx[xyvector_vert]
         yvector_vert = pry[xyvector_vert]
         #
-        NewData = self.rr1.upsplitting(
-            DataToSplit, ivector_vert, xvector_vert, yvector_vert, pvector_vert
-        )
-        #
-        #
-        ndlength = NewData["length"]
-        #
-        #
-        AssocNewData = self.rr1.nulldata()
-        detection = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
-        newactive = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
-        newdone = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
-        newimpossible = torch.zeros((ndlength), dtype=torch.bool, device=Dvc)
-        lower = 0
-        for i in range(ndlength):
-            assert lower < ndlength
-            upper = lower + 1000
-            if upper > ndlength:
-                upper = ndlength
-            detection[:] = False
-            detection[lower:upper] = True
-            NewDataSlice = self.rr1.detectsubdata(NewData, detection)
-            AssocNewDataSlice = self.rr2.process(NewDataSlice)
-            AssocNewData = self.rr1.appenddata(AssocNewData, AssocNewDataSlice)
-            newactive_s, newdone_s, newimpossible_s = self.rr2.filterdata(
-                AssocNewDataSlice
+        ndlength = len(ivector_vert)
+        #
+        # the children are made, propagated and filtered one slice at a time
+        # and only the active and done ones are kept
+        self.rr2.resetearlyexit()
+        NewActiveBatch = self.rr1.newbatch()
+        NewDoneBatch = self.rr1.newbatch()
+        newdone_count = 0
+        newimpossible_count = 0
+        # the history counters are weighted by multiplicity, like the ECN
+        newdone_weight = 0
+        newimpossible_weight = 0
+        parentkeys = self.MC.parentkeys(DataToSplit)
+        for lower, upper, NewDataSlice in self.rr1.splitslices(
+            DataToSplit,
+            ivector_vert,
+            xvector_vert,
+            yvector_vert,
+            pvector_vert,
+            self.MB.slicesize,
+        ):
+            keys = self.MC.childkeys(
+                parentkeys,
+                ivector_vert[lower:upper],
+                xvector_vert[lower:upper],
+                yvector_vert[lower:upper],
+                pvector_vert[lower:upper],
             )
-            newactive[lower:upper] = newactive_s
-            newdone[lower:upper] = newdone_s
-            newimpossible[lower:upper] = newimpossible_s
-            lower = upper
-            if lower >= ndlength:
-                break
-        #
-        NewActiveData = self.rr1.detectsubdata(AssocNewData, newactive)
-        #
-        NewDoneData = self.rr1.detectsubdata(AssocNewData, newdone)
+            AssocNewDataSlice, filters_s = self.MC.processcut(
+                NewDataSlice,
+                keys,
+                xvector_vert[lower:upper],
+                yvector_vert[lower:upper],
+            )
+            newactive_s, newdone_s, newimpossible_s = filters_s
+            NewActiveBatch = self.rr1.appenddata(
+                NewActiveBatch,
+                self.rr1.detectsubdata(AssocNewDataSlice, newactive_s),
+            )
+            NewDoneBatch = self.rr1.appenddata(
+                NewDoneBatch,
+                self.rr1.detectsubdata(AssocNewDataSlice, newdone_s),
+            )
+            newdone_count += newdone_s.to(torch.int64).sum(0)
+            newimpossible_count += newimpossible_s.to(torch.int64).sum(0)
+            multiplicity_s = AssocNewDataSlice["multiplicity"]
+            newdone_weight += multiplicity_s[newdone_s].sum(0)
+            newimpossible_weight += multiplicity_s[newimpossible_s].sum(0)
+        #
+        self.MB.observe(
+            DataToSplit, ndlength, NewActiveBatch.length + NewDoneBatch.length
+        )
+        NewActiveData = self.rr1.batchview(NewActiveBatch)
+        #
+        NewDoneData = self.rr1.batchview(NewDoneBatch)
+        #
+        # isomorphic active nodes under the stabilizer of sigma are replaced
+        # by one representative, with the multiplicities added up
+        if (
+            self.pp.symmetry_reduction
+            and self.merging
+            and NewActiveData["length"] > 0
+        ):
+            CanonicalData = self.SR.canonicalize(NewActiveData)
+            ReducedData = self.TT.dedup(CanonicalData)
+            self.SR.countsaved(CanonicalData, ReducedData)
+            NewActiveData = ReducedData
         #
         if NewActiveData["length"] > 0:
-            phase1 = NewActiveData["info"][:, self.pp.phase] == 1
-            phase2 = NewActiveData["info"][:, self.pp.phase] == 2
+            phase1 = NewActiveData["phase"] == 1
+            phase2 = NewActiveData["phase"] == 2
             tirage = torch.rand(NewActiveData["length"], device=Dvc)
             phasechange = phase2 & (tirage < self.pp.splitting_probability)
-            newphase = NewActiveData["info"][:, self.pp.phase].clone()
+            newphase = NewActiveData["phase"].clone()
             newphase[phase1] = 0
             newphase[phasechange] = 1
-            NewActiveData["info"][:, self.pp.phase] = newphase
+            NewActiveData["phase"] = newphase
         #
-        self.HST.current_proof_impossible_count += newimpossible.to(
-            torch.int64
-        ).sum(0)
-        self.HST.current_proof_done_count += newdone.to(torch.int64).sum(0)
+        self.HST.current_proof_impossible_count += newimpossible_weight
+        self.HST.current_proof_done_count += newdone_weight
+        self.stepcounts = {
+            "children": ndlength,
+            "done": int(newdone_count),
+            "impossible": int(newimpossible_count),
+        }
         #
         if self.pp.verbose:
             print(" >>>")
             print("DataToSplit", itp(DataToSplit["length"]))
-            print("NewData", itp(NewData["length"]))
+            print("NewData", itp(ndlength))
             print("NewActiveData", itp(NewActiveData["length"]))
             print("NewDoneData", itp(NewDoneData["length"]))
+            print(
+                "early exit rows",
+                itp(self.rr2.early_exit_rows),
+                "row-iterations saved",
+                itp(self.rr2.early_exit_iterations),
+            )
+            self.MC.printstats()
             print("----------------------------------")
         #
         return NewActiveData, NewDoneData
@@ -15,18 +15,26 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import gc
+import time
 
 import torch
 
+from async_classifier import AsyncClassifier
+from checkpoint import ProofCheckpoint
 from constants import Dvc
+from frontier import DepthFrontier
 from historical import Historical
+from memory_governor import MemoryGovernor
 from relations_3 import Relations3
-from utils import arangeic, itf, itp, itt, memReport, nump, numpr
+from root_cache import RootCache
+from spill import SpillStore
+from state_batch import StateBatch
+from telemetry import Telemetry
+from utils import arangeic, itf, itp, nump, numpr
 
 
 class Relations4:
-    def __init__(self, pp, HST: Historical):
+    def __init__(self, pp, HST: Historical, RC=None):
         #
         self.pp = pp
         #
@@ -35,6 +43,17 @@ class Relations4:
         self.rr2 = self.rr3.rr2
         self.rr1 = self.rr3.rr1
         #
+        self.TT = self.rr3.TT
+        # one root cache can be shared by the Relations4 of a Driver
+        if RC is None:
+            RC = RootCache(pp, self.rr2)
+        self.RC = RC
+        self.CP = ProofCheckpoint(pp)
+        self.MG = MemoryGovernor(pp)
+        self.TM = Telemetry(pp)
+        self.classifier_seconds = 0.0
+        self.SR = self.rr3.SR
+        #
         self.alpha = self.pp.alpha
         self.alpha2 = self.alpha * self.alpha
         self.alpha3 = self.alpha * self.alpha * self.alpha
@@ -49,12 +68,16 @@ class Relations4:
         self.periodicity = self.pp.periodicity
         self.stopthreshold = self.pp.stopthreshold
         #
-        self.SamplePool = self.rr1.nulldata()
-        self.DroppedSamplePool = self.rr1.nulldata()
+        self.SamplePool = self.rr1.newbatch()
+        self.DroppedSamplePool = self.rr1.newbatch()
         # these are by convention active (not done or impossible)
+        self.MG.register("SamplePool", lambda: self.SamplePool)
         #
-        self.donecount = itt(0)
+        # host-side counts, so the proof loop has no scalar tensors to sync
+        self.donecount = 0
         self.ECN = 0.0
+        self.merging = self.pp.transposition_table
+        self.spilling = True
         #
         self.proofnumber = 0
         self.allnumbers = 0
@@ -62,8 +85,8 @@ class Relations4:
         self.dropoutratio = 1.0
 
     def resetsamples(self):
-        self.SamplePool = self.rr1.nulldata()
-        self.DroppedSamplePool = self.rr1.nulldata()
+        self.SamplePool = self.rr1.newbatch()
+        self.DroppedSamplePool = self.rr1.newbatch()
         #
         self.rr2.impossible_basic_count = 0
         self.rr2.halfones_count = 0
@@ -79,15 +102,16 @@ class Relations4:
         b = self.beta
         bz = self.betaz
         #
+        if Data["length"] == 0:
+            print("length 0, no examples to print")
+            return
+        #
+        Data = self.rr1.unpackdata(Data)
         length = Data["length"]
         depth = Data["depth"]
         prod = Data["prod"]
         ternary = Data["ternary"]
         #
-        if length == 0:
-            print("length 0, no examples to print")
-            return
-        #
         bini = ternary.to(torch.int64)
         ternary_print = bini[:, :, 0] + 2 * bini[:, :, 1] - 1
         #
@@ -103,8 +127,85 @@ class Relations4:
             print(nump(ternary_print[indexi]))
         print("---------------------------------------")
 
+    def makepool(self, Data):  # the active pool in the form proofloop uses
+        if not self.pp.depth_frontier:
+            return self.rr1.batchdata(Data)
+        if isinstance(Data, DepthFrontier):
+            return Data
+        # dropout pools are cut down at each step, they are never spilled
+        if self.pp.spill_threshold is None or not self.spilling:
+            Frontier = DepthFrontier()
+        else:
+            Frontier = DepthFrontier(SpillStore(self.pp, self.rr1))
+        Frontier.push(Data)
+        return Frontier
+
+    def residentlength(self, Pool):  # the active nodes held in memory
+        if isinstance(Pool, DepthFrontier):
+            return Pool.resident
+        return Pool["length"]
+
+    def pooldata(self, Pool):  # the active pool as a Data dict
+        # brings back any spilled segments, so only for pools that fit
+        if isinstance(Pool, DepthFrontier):
+            if Pool.length == 0:
+                return self.rr1.nulldata()
+            Pool.restore(Pool.length)
+            return Pool.view()
+        return Pool
+
+    def residentdata(self, Pool):  # the part of the pool held in memory
+        if isinstance(Pool, DepthFrontier):
+            if Pool.resident == 0:
+                return self.rr1.nulldata()
+            Parts = [Data for _, Data in Pool.residentbuckets()]
+            return Pool.concatenate(Parts)
+        return self.pooldata(Pool)
+
+    def spilledsegments(self, Pool):  # depth, path, length, multiplicity
+        if isinstance(Pool, DepthFrontier) and Pool.spill is not None:
+            return list(Pool.spill.segments)
+        return []
+
     def transitionactive(self, ActivePool, cdetection, NewActiveData):
         #
+        if isinstance(ActivePool, (DepthFrontier, StateBatch)):
+            if self.pp.packed_pools:
+                NewActiveData = self.rr1.packdata(NewActiveData)
+        elif self.rr1.ispacked(ActivePool):
+            NewActiveData = self.rr1.packdata(NewActiveData)
+        # a plain dict pool (as in the minimizer) keeps the format it has
+        #
+        if isinstance(ActivePool, DepthFrontier):
+            # the chunk was taken out by selectchunk, the new nodes are
+            # merged or appended bucket by bucket
+            for d, SubData in ActivePool.bydepth(NewActiveData):
+                if self.merging:
+                    SubData = self.TT.dedup(SubData)
+                    MergedData = self.TT.mergeinto(
+                        ActivePool.bucket(d), SubData
+                    )
+                    ActivePool.multiplicity_total += self.rr1.multiplicitysum(
+                        SubData
+                    ) - self.rr1.multiplicitysum(MergedData)
+                    if self.pp.symmetry_reduction:
+                        self.SR.countsaved(SubData, MergedData)
+                    SubData = MergedData
+                ActivePool.push(SubData)
+            return ActivePool
+        #
+        if isinstance(ActivePool, StateBatch):
+            # in place: the cost is in the chunk and the new nodes
+            ActivePool.compact(~cdetection)
+            if self.merging:
+                NewActiveData = self.TT.dedup(NewActiveData)
+                MergedData = self.TT.mergeinto(ActivePool, NewActiveData)
+                if self.pp.symmetry_reduction:
+                    self.SR.countsaved(NewActiveData, MergedData)
+                NewActiveData = MergedData
+            ActivePool.append(NewActiveData)
+            return ActivePool
+        #
         ResidualActive = self.rr1.detectsubdata(ActivePool, ~cdetection)
         NextActivePool = self.rr1.appenddata(NewActiveData, ResidualActive)
         #
@@ -115,9 +216,8 @@ class Relations4:
 
     def transitiondone(self, C, DonePool, DoneData, aplength):
         #
-        idl = DoneData["length"]
-        #
-        self.donecount += idl
+        # a merged node counts for all the nodes it stands for
+        self.donecount += self.rr1.multiplicitysum(DoneData)
         #
         #
         if self.pp.verbose:
@@ -125,14 +225,23 @@ class Relations4:
         #
         #
         # NewDonePool = self.rr1.nulldata()
+        if self.pp.packed_pools:
+            DoneData = self.rr1.packdata(DoneData)
         NewDonePool = self.rr1.appenddata(DonePool, DoneData)
         ndlength = NewDonePool["length"]
         if ndlength > self.done_max:
             # print("new done pool of length",itp(ndlength),"so we send to classifier for processing")
             print("/", end="")
-            DataToProcess = self.rr1.copydata(NewDonePool)
-            NewDonePool = self.rr1.nulldata()
+            DataToProcess = self.rr1.unpackdata(
+                self.rr1.copydata(NewDonePool)
+            )
+            if isinstance(NewDonePool, StateBatch):
+                NewDonePool.clear()
+            else:
+                NewDonePool = self.rr1.nulldata()
+            start = time.perf_counter()
             C.process(DataToProcess)
+            self.classifier_seconds += time.perf_counter() - start
             #
         return NewDonePool
 
@@ -145,51 +254,120 @@ class Relations4:
         if aplength == 0:
             assert DroppedPool["length"] == 0
             return
-        apdepth = ActivePool["depth"].to(torch.int64)
-        #
-        aprectangle = ActivePool["info"][
-            :, self.pp.sampleinfolower : self.pp.sampleinfoupper
-        ].clone()
-        #
-        aprange = arangeic(aplength)
-        #
-        # now add the new sample locations to the rectangle
-        newsloc = arangeic(aplength) + slength
-        #
-        aprectangle[aprange, apdepth] = newsloc
-        #
-        # this should modify active pool outside the present function:
-        ActivePool["info"][
-            :, self.pp.sampleinfolower : self.pp.sampleinfoupper
-        ] = aprectangle
-        # that isn't needed for dropped pool since it doesn't get refered back to later
         #
+        # the sample pool keeps each node's pointer to its nearest sampled
+        # ancestor, then the active nodes point to their own new sample
+        # locations so that their children inherit them
         self.SamplePool = self.rr1.appenddata(self.SamplePool, ActivePool)
         self.DroppedSamplePool = self.rr1.appenddata(
             self.DroppedSamplePool, DroppedPool
         )
         #
+        newsloc = arangeic(aplength) + slength
+        # this should modify active pool outside the present function:
+        ActivePool["ancestor"][:] = newsloc.to(torch.int32)
+        # that isn't needed for dropped pool since it doesn't get refered back to later
+        #
         # print("sample pool has size",itp(self.SamplePool['length']))
         # Fws.trace("transition samples Active Pool",ActivePool,5,0,0,0)
         # Fws.trace("transition samples Sample Pool",self.SamplePool,5,0,0,0)
         # self.printsampleex()
         return
 
-    def proofloop(self, Mstrat, Mlearn, C, Input, dropoutlimit):
+    def ancestryincidence(self, ancestor):
+        # incidence[i,j] = 1 when sample j is a strict ancestor of node i,
+        # following the parent pointers of the sample pool
+        length = len(ancestor)
+        splength = self.SamplePool["length"]
+        parents = self.SamplePool["ancestor"].to(torch.int64)
+        #
+        incidence = torch.zeros(
+            (length, splength), dtype=torch.float, device=Dvc
+        )
+        irange = arangeic(length)
+        current = ancestor.to(torch.int64).clone()
+        for d in range(splength + 1):
+            live = current >= 0
+            if not live.any(0):
+                break
+            incidence[irange[live], current[live]] = 1.0
+            current[live] = parents[current[live]]
+        return incidence
+
+    def checkpointstate(self, C, Input, ActivePool, DonePool, EDN, step, peak):
+        return {
+            "sigma": Input["sigma"],
+            "step": step,
+            "peak": peak,
+            "ActivePool": self.residentdata(ActivePool),
+            "Segments": self.spilledsegments(ActivePool),
+            "DonePool": self.rr1.batchview(self.rr1.batchdata(DonePool)),
+            "ECN": self.ECN,
+            "EDN": EDN,
+            "donecount": self.donecount,
+            "eqlist": C.eqlist,
+            "eqlength": C.eqlength,
+            "valency_frequency": self.HST.current_proof_valency_frequency,
+            "impossible_count": self.HST.current_proof_impossible_count,
+            "done_count": self.HST.current_proof_done_count,
+            "passive_count": self.HST.current_proof_passive_count,
+            "benchmark": self.HST.current_proof_benchmark,
+            "impossible_basic_count": self.rr2.impossible_basic_count,
+            "halfones_count": self.rr2.halfones_count,
+            "merged_count": self.TT.merged_count,
+        }
+
+    def resumestate(self, C, State):  # the pools are returned
+        self.ECN = State["ECN"]
+        self.donecount = State["donecount"]
+        C.eqlist = State["eqlist"]
+        C.eqlength = State["eqlength"]
+        self.HST.current_proof_valency_frequency[:] = State[
+            "valency_frequency"
+        ]
+        self.HST.current_proof_impossible_count = State["impossible_count"]
+        self.HST.current_proof_done_count = State["done_count"]
+        self.HST.current_proof_passive_count = State["passive_count"]
+        self.HST.current_proof_benchmark = State["benchmark"]
+        self.rr2.impossible_basic_count = State["impossible_basic_count"]
+        self.rr2.halfones_count = State["halfones_count"]
+        self.TT.merged_count = State["merged_count"]
+        ActivePool = self.makepool(State["ActivePool"])
+        # the spilled segments are picked up from the checkpoint's links,
+        # or read in when this pool does not spill
+        Loader = SpillStore(self.pp, self.rr1)
+        for depth, path, length, multiplicity in State["Segments"]:
+            if isinstance(ActivePool, DepthFrontier):
+                if ActivePool.spill is not None:
+                    ActivePool.adopt(depth, path, length, multiplicity)
+                else:
+                    ActivePool.push(Loader.load(path, length))
+            else:
+                ActivePool = self.rr1.appenddata(
+                    ActivePool, Loader.load(path, length)
+                )
+        DonePool = self.rr1.batchdata(State["DonePool"])
+        return ActivePool, DonePool
+
+    def proofloop(self, Mstrat, Mlearn, C, Input, dropoutlimit, resume=False):
         #
         self.resetsamples()
+        self.TM.proof += 1
+        self.CP.start()
         #
         if dropoutlimit > 0:
             randomize = True
         else:
             randomize = False
         #
-        InitialActiveData = self.rr2.process(Input)
-        activedetect, donedetect, impossibledetect = self.rr2.filterdata(
-            InitialActiveData
-        )
-        implength = impossibledetect.to(torch.int).sum(0)
-        donelength = donedetect.to(torch.int).sum(0)
+        (
+            InitialActiveData,
+            activedetect,
+            donedetect,
+            impossibledetect,
+        ) = self.RC.processedroots(Input)
+        implength = int(impossibledetect.to(torch.int64).sum(0))
+        donelength = int(donedetect.to(torch.int64).sum(0))
         if self.pp.verbose:
             print(
                 "initial filter finds",
@@ -203,15 +381,29 @@ class Relations4:
         napcount = 0
         #
         DonePool = self.rr1.detectsubdata(InitialActiveData, donedetect)
-        self.donecount = itt(0)
+        if self.pp.packed_pools:
+            ActivePool = self.rr1.packdata(ActivePool)
+            DonePool = self.rr1.packdata(DonePool)
+        self.TT.merged_count = 0
+        self.SR.saved = {}
+        # a dropout proof samples individual nodes, so nothing is merged
+        self.rr3.merging = dropoutlimit == 0
+        self.merging = self.pp.transposition_table and self.rr3.merging
+        self.rr3.MC.enabled = dropoutlimit > 0
+        self.spilling = dropoutlimit == 0
+        if self.merging:
+            ActivePool = self.TT.dedup(ActivePool)
+        ActivePool = self.makepool(ActivePool)
+        DonePool = self.rr1.batchdata(DonePool)
+        self.donecount = 0
         if ActivePool["length"] == 0:
             DonePool = self.transitiondone(
                 DonePool, self.rr1.nulldata(), ActivePool["length"]
             )
         #
         #
-        self.ECN = itt(ActivePool["length"]).to(torch.float).clone()
-        EDN = self.ECN.clone()
+        self.ECN = float(self.rr1.multiplicitysum(ActivePool))
+        EDN = self.ECN
         if self.pp.verbose:
             print(
                 "starting with ECN = EDN from initial active pool",
@@ -220,22 +412,41 @@ class Relations4:
         #
         if dropoutlimit > 0:
             ActivePool, DroppedPool, newsum, droppedsum = self.dropoutdata(
-                Mlearn, ActivePool, dropoutlimit
+                Mlearn, self.pooldata(ActivePool), dropoutlimit
             )
+            ActivePool = self.makepool(ActivePool)
             if self.pp.dropout_style == "adaptive":
-                activelengthf = (
-                    itt(ActivePool["length"]).clone().to(torch.float)
-                )
+                activelengthf = float(self.rr1.multiplicitysum(ActivePool))
                 self.ECN = activelengthf + droppedsum
                 EDN = 0.0
         #
+        # the closures follow the pools as they are replaced
+        self.MG.register("ActivePool", lambda: ActivePool)
+        self.MG.register("DonePool", lambda: DonePool)
+        #
         stepcount = 0
-        for i in range(self.prooflooplength):
+        peakfrontier = int(ActivePool["length"])
+        # checkpoints are only kept for full proofs
+        if resume and dropoutlimit == 0:
+            State = self.CP.load(Input["sigma"])
+            if State is not None:
+                ActivePool, DonePool = self.resumestate(C, State)
+                EDN = State["EDN"]
+                stepcount = State["step"]
+                peakfrontier = State["peak"]
+                print("resuming proof after step", stepcount)
+        # the done batches can be classified in a thread while the search
+        # goes on, see async_classifier.py
+        if self.pp.async_classifier:
+            Cp = AsyncClassifier(C, self.pp.classifier_queue)
+        else:
+            Cp = C
+        for i in range(stepcount, self.prooflooplength):
             stepcount += 1
             prooflength = i
             if ActivePool["length"] > 0:
                 #
-                PreAPL = itt(ActivePool["length"]).clone()
+                PreAPL = self.rr1.multiplicitysum(ActivePool)
                 #
                 if self.pp.verbose:
                     print("= = = = = =  loop", i, "= = = = =", end=" ")
@@ -247,15 +458,18 @@ class Relations4:
                         itp(self.proofinstance),
                         "> = = = =",
                     )
-                else:
-                    print(".", end="")
-                    if (i % 50) == 49:
-                        print(" ")
-                    if (i % 100) == 0:
-                        print(i)
+                # otherwise the progress is printed from the telemetry
                 napcount += 1
+                timings = (
+                    self.rr2.timings["propagation"],
+                    self.rr2.timings["filter"],
+                    self.rr3.IE.seconds,
+                    self.classifier_seconds,
+                )
                 #
-                ChunkData, cdetection = self.rr3.selectchunk(ActivePool)
+                ChunkData, cdetection = self.rr3.selectchunk(
+                    ActivePool, Mstrat
+                )
                 #
                 #
                 CurrentData, DoneData = self.rr3.managesplit(
@@ -266,12 +480,12 @@ class Relations4:
                 ActivePool = self.transitionactive(
                     ActivePool, cdetection, CurrentData
                 )
+                if ActivePool["length"] > peakfrontier:
+                    peakfrontier = int(ActivePool["length"])
                 # do the following before dropout
                 if dropoutlimit == 0:
-                    EDN = itt(ActivePool["length"]).clone().to(torch.float)
-                    self.ECN += (
-                        itt(CurrentData["length"]).clone().to(torch.float)
-                    )
+                    EDN = float(self.rr1.multiplicitysum(ActivePool))
+                    self.ECN += float(self.rr1.multiplicitysum(CurrentData))
                     if self.ECN > self.HST.proof_nodes_max:
                         print("break after maximum proof nodes")
                         break
@@ -281,9 +495,7 @@ class Relations4:
                         self.pp.dropout_style == "regular"
                         or self.pp.dropout_style == "uniform"
                     ):
-                        PostAPL = (
-                            itt(ActivePool["length"]).clone().to(torch.float)
-                        )
+                        PostAPL = float(self.rr1.multiplicitysum(ActivePool))
                         ratio = PostAPL / PreAPL
                         EDN *= ratio
                         self.ECN += EDN
@@ -292,13 +504,16 @@ class Relations4:
                         DroppedPool,
                         newsum,
                         droppedsum,
-                    ) = self.dropoutdata(Mlearn, ActivePool, dropoutlimit)
+                    ) = self.dropoutdata(
+                        Mlearn, self.pooldata(ActivePool), dropoutlimit
+                    )
                     #
                     self.transitionsamples(ActivePool, DroppedPool)
+                    ActivePool = self.makepool(ActivePool)
                     #
                     if self.pp.dropout_style == "adaptive":
-                        activelengthf = (
-                            itt(ActivePool["length"]).clone().to(torch.float)
+                        activelengthf = float(
+                            self.rr1.multiplicitysum(ActivePool)
                         )
                         self.ECN += activelengthf + droppedsum
                         EDN = 0.0
@@ -306,7 +521,7 @@ class Relations4:
                     #
                     #
                     if self.pp.verbose:
-                        self.printexamples(ActivePool)
+                        self.printexamples(self.pooldata(ActivePool))
                 #
                 #
                 if self.pp.verbose:
@@ -335,15 +550,29 @@ class Relations4:
                         end=" ",
                     )
                 DonePool = self.transitiondone(
-                    C, DonePool, DoneData, ActivePool["length"]
+                    Cp, DonePool, DoneData, ActivePool["length"]
                 )
                 #
-                gcc = gc.collect()
+                self.TM.emit(
+                    "step",
+                    step=i,
+                    chunk=ChunkData["length"],
+                    children=self.rr3.stepcounts["children"],
+                    active=CurrentData["length"],
+                    done=self.rr3.stepcounts["done"],
+                    impossible=self.rr3.stepcounts["impossible"],
+                    propagation=self.rr2.timings["propagation"] - timings[0],
+                    filter=self.rr2.timings["filter"] - timings[1],
+                    network=self.rr3.IE.seconds - timings[2],
+                    classifier=self.classifier_seconds - timings[3],
+                    activepool_bytes=self.MG.poolbytes(ActivePool),
+                )
+                self.MG.step()
                 if self.pp.verbose:
-                    memReport("mg")
+                    self.MG.report()
                     #
                     #
-                    if 0 < dropoutlimit <= self.pp.chunksize:
+                    if 0 < dropoutlimit <= self.rr3.MB.chunksize:
                         print(
                             "Estimated nodes at this depth",
                             numpr(EDN, 1),
@@ -358,16 +587,31 @@ class Relations4:
                             numpr(self.ECN, 1),
                         )
                 #
+                if dropoutlimit == 0 and self.CP.due(stepcount):
+                    if Cp is not C:
+                        Cp.flush()  # eqlist is then up to date
+                    self.CP.save(
+                        self.checkpointstate(
+                            C,
+                            Input,
+                            ActivePool,
+                            DonePool,
+                            EDN,
+                            stepcount,
+                            peakfrontier,
+                        )
+                    )
+                #
                 if ActivePool["length"] == 0:
                     break
-                if ActivePool["length"] > self.stopthreshold:
+                if self.residentlength(ActivePool) > self.stopthreshold:
                     print("over threshold --------->>>>>>>>>>>>>>>>> stopping")
                     break
                 #
                 #
             if ActivePool["length"] == 0:
                 break
-            if ActivePool["length"] > self.stopthreshold:
+            if self.residentlength(ActivePool) > self.stopthreshold:
                 print("over threshold --------->>>>>>>>>>>>>>>>> stopping")
                 break
             #
@@ -375,15 +619,29 @@ class Relations4:
             # siesta(self.sleeptime)
             #
         #
-        print("|||")
+        self.TM.emit("end", steps=stepcount)
+        self.TM.flush()
         activelength = ActivePool["length"]
+        if isinstance(ActivePool, DepthFrontier) and (
+            ActivePool.spill is not None
+        ):
+            if self.pp.verbose:
+                ActivePool.spill.printstats()
+            ActivePool.closespill()
+        self.MG.unregister("ActivePool")
+        self.MG.unregister("DonePool")
+        if Cp is not C:
+            Cp.close()  # the barrier for the batches still queued
+            if self.pp.verbose:
+                Cp.printstats()
         donelength = DonePool["length"]
         if donelength > 0:
-            C.process(DonePool)
+            C.process(self.rr1.unpackdata(DonePool))
             DonePool = self.rr1.nulldata()
         #
         if dropoutlimit == 0:
-            cumulative_nodes = torch.round(self.ECN).to(torch.int64)
+            self.CP.remove()
+            cumulative_nodes = round(self.ECN)
             self.HST.record_full_proof(
                 Mstrat, stepcount, cumulative_nodes, self.donecount
             )
@@ -391,6 +649,17 @@ class Relations4:
             self.HST.record_dropout_proof(
                 self.pp.dropout_style, dropoutlimit, stepcount, self.ECN
             )
+        self.HST.record_frontier(
+            self.pp.frontier_policy, stepcount, peakfrontier
+        )
+        self.TM.emit(
+            "proof",
+            steps=stepcount,
+            dropout=dropoutlimit,
+            ECN=self.ECN,
+            donecount=self.donecount,
+            peak=peakfrontier,
+        )
         #
         if self.pp.verbose:
             if activelength > 0:
@@ -413,6 +682,11 @@ class Relations4:
                 itp(self.rr2.impossible_basic_count),
             )
             print("half ones count is", itp(self.rr2.halfones_count))
+            print("peak active pool", itp(peakfrontier))
+            self.rr3.IE.printstats()
+            print("transposition merges", itp(self.TT.merged_count))
+            if self.pp.symmetry_reduction:
+                self.SR.printsaved()
         return True, ActivePool, DonePool, prooflength
 
     def dropoutdata(self, M, Data, dropoutlimit):
@@ -452,28 +726,9 @@ class Relations4:
 
     def extent_sliced(self, M, Data):
         #
-        length = Data["length"]
-        if length <= 1000:
-            extent_log = M.network(Data).detach()
-            extent_log = torch.clamp(extent_log, 0.0, 8.0)
-            extent = 10 ** extent_log
-            return extent
-        extent = torch.zeros((length), dtype=torch.float, device=Dvc)
-        lrange = arangeic(length)
-        #
-        lower = 0
-        for i in range(length):
-            upper = lower + 1000
-            if upper > length:
-                upper = length
-            indices = lrange[lower:upper]
-            DataSlice = self.rr1.indexselectdata(Data, indices)
-            extent_log = M.network(DataSlice).detach()
-            extent_log = torch.clamp(extent_log, 0.0, 8.0)
-            extent[lower:upper] = 10 ** extent_log
-            lower = upper
-            if upper >= length:
-                break
+        extent_log = self.rr3.IE.extentlog(M, Data)
+        extent_log = torch.clamp(extent_log, 0.0, 8.0)
+        extent = 10 ** extent_log
         return extent
 
     def dropoutdataAdaptive(self, M, Data, dropoutlimit):
@@ -487,7 +742,7 @@ class Relations4:
         tirage = torch.rand(length, device=Dvc)
         detection = tirage < proba
         indices1 = arangeic(length)[detection]
-        dlength = detection.to(torch.int64).sum(0)
+        dlength = int(detection.to(torch.int64).sum(0))
         if dlength > dropoutlimit:
             indices1 = arangeic(length)[detection]
             permutation = torch.randperm(dlength)
@@ -497,13 +752,13 @@ class Relations4:
         if length <= dropoutlimit:
             NewData = self.rr1.copydata(Data)
             DroppedData = self.rr1.nulldata()
-            newsum = extent.sum(0)
+            newsum = float(extent.sum(0))
             droppedsum = 0.0
         else:
             NewData = self.rr1.detectsubdata(Data, detection)
             DroppedData = self.rr1.detectsubdata(Data, (~detection))
-            newsum = (extent[detection]).sum(0)
-            droppedsum = (extent[~detection]).sum(0)
+            newsum = float((extent[detection]).sum(0))
+            droppedsum = float((extent[~detection]).sum(0))
         return NewData, DroppedData, newsum, droppedsum
 
     def dropoutdataUniform(self, M, Data, dropoutlimit):
@@ -548,13 +803,13 @@ class Relations4:
         if length <= dropoutlimit:
             NewData = self.rr1.copydata(Data)
             DroppedData = self.rr1.nulldata()
-            newsum = extent.sum(0)
+            newsum = float(extent.sum(0))
             droppedsum = 0.0
         else:
             NewData = self.rr1.detectsubdata(Data, detection)
             DroppedData = self.rr1.detectsubdata(Data, (~detection))
-            newsum = (extent[detection]).sum(0)
-            droppedsum = (extent[~detection]).sum(0)
+            newsum = float((extent[detection]).sum(0))
+            droppedsum = float((extent[~detection]).sum(0))
         return NewData, DroppedData, newsum, droppedsum
 
     def printsampleex(self):
@@ -566,7 +821,7 @@ class Relations4:
             upper = samplelength
         permutation = torch.randperm(samplelength, device=Dvc)
         depth = self.SamplePool["depth"]
-        points = self.SamplePool["info"][:, self.pp.samplepoints]
+        ancestor = self.SamplePool["ancestor"]
         for i in range(upper):
             ip = permutation[i]
             print(
@@ -574,7 +829,7 @@ class Relations4:
                 ip,
                 "depth",
                 itp(depth[ip]),
-                "points",
-                itp(points[ip]),
+                "ancestor",
+                itp(ancestor[ip]),
             )
         return
@@ -0,0 +1,148 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+import torch
+
+from constants import CpuDvc, Dvc
+
+
+class RootCache:  # processed roots per sigma and the left table, on disk
+    def __init__(self, pp, rr2):
+        #
+        self.pp = pp
+        self.rr2 = rr2
+        self.rr1 = rr2.rr1
+        #
+        # the file and its contents, the path is that of the current pp
+        self.contentspath = None
+        self.contents = None
+        #
+
+    def path(self):  # the roots only depend on alpha, beta and sigma, the
+        # codes have all the filter bits so the flags are applied on reading
+        if self.pp.root_cache_dir is None:
+            return None
+        filename = "roots_a{}_b{}.pt".format(self.pp.alpha, self.pp.beta)
+        return os.path.join(self.pp.root_cache_dir, filename)
+
+    def load(self):
+        path = self.path()
+        if self.contents is not None and self.contentspath == path:
+            return
+        self.contentspath = path
+        self.contents = {}
+        if path is None or not os.path.exists(path):
+            return
+        try:
+            self.contents = torch.load(path, map_location=CpuDvc, mmap=True)
+        except TypeError:  # older torch without mmap
+            self.contents = torch.load(path, map_location=CpuDvc)
+        return
+
+    def save(self):  # write then rename, so a partial file is never read
+        os.makedirs(os.path.dirname(self.contentspath), exist_ok=True)
+        temporary = self.contentspath + ".tmp"
+        torch.save(self.contents, temporary)
+        os.replace(temporary, self.contentspath)
+        return
+
+    def lefttable(self, make_init_left_table):
+        if self.path() is None:
+            return make_init_left_table()
+        self.load()
+        if "left_table" in self.contents:
+            init_left_table = self.contents["left_table"].to(Dvc)
+            print("left table instances 0 <= sigma <", len(init_left_table))
+            print("   (from", self.contentspath, ")")
+            return len(init_left_table), init_left_table
+        length, init_left_table = make_init_left_table()
+        self.contents = {
+            "left_table": init_left_table.to(CpuDvc),
+            "known": torch.zeros((length), dtype=torch.bool),
+        }
+        self.save()
+        return length, init_left_table
+
+    def store(self, sigmas, ProcessedData, hitcode):
+        PackedData = self.rr1.packdata(ProcessedData)
+        length = len(self.contents["known"])
+        for ky in self.rr1.packedkeys:
+            item = PackedData[ky].to(CpuDvc)
+            if ky not in self.contents:
+                self.contents[ky] = torch.zeros(
+                    (length,) + tuple(item.size()[1:]), dtype=item.dtype
+                )
+            self.contents[ky] = self.contents[ky].clone()
+            self.contents[ky][sigmas] = item
+        if "hitcode" not in self.contents:
+            self.contents["hitcode"] = torch.zeros((length), dtype=torch.int8)
+        self.contents["hitcode"] = self.contents["hitcode"].clone()
+        self.contents["hitcode"][sigmas] = hitcode.to(CpuDvc)
+        self.contents["known"] = self.contents["known"].clone()
+        self.contents["known"][sigmas] = True
+        self.save()
+        return
+
+    def processedroots(self, Data):
+        # like process followed by filterdata on the initial data
+        path = self.path()
+        if path is not None:
+            self.load()
+        if (
+            path is None
+            or Data["length"] == 0
+            or "known" not in self.contents
+        ):
+            ProcessedData = self.rr2.process(Data)
+            activedetect, donedetect, impossibledetect = self.rr2.filterdata(
+                ProcessedData
+            )
+            return ProcessedData, activedetect, donedetect, impossibledetect
+        #
+        sigma = Data["sigma"].to(torch.int64)
+        sigmacpu = sigma.to(CpuDvc)
+        known = self.contents["known"][sigmacpu]
+        if not known.all(0):
+            missing = torch.unique(sigmacpu[~known])
+            firstrows = [
+                int((sigmacpu == s).nonzero(as_tuple=True)[0][0])
+                for s in missing.tolist()
+            ]
+            MissData = self.rr1.indexselectdata(
+                Data, torch.tensor(firstrows, dtype=torch.int64, device=Dvc)
+            )
+            ProcessedMiss = self.rr2.process(MissData)
+            _, _, _, misscode = self.rr2.filterfused(
+                ProcessedMiss, counting=False, allcodes=True
+            )
+            self.store(missing, ProcessedMiss, misscode)
+        #
+        PackedRoots = {"length": Data["length"]}
+        for ky in self.rr1.packedkeys:
+            PackedRoots[ky] = self.contents[ky][sigmacpu].to(Dvc)
+        Roots = self.rr1.unpackdata(PackedRoots)
+        ProcessedData = self.rr1.copydata(Data)
+        for ky in self.rr1.packedkeys:
+            ProcessedData[ky] = Roots[ky]
+        hitcode = self.contents["hitcode"][sigmacpu].to(Dvc)
+        self.rr2.countfilters(hitcode)
+        activedetect, donedetect, impossibledetect = self.rr2.filtersfromcode(
+            hitcode
+        )
+        return ProcessedData, activedetect, donedetect, impossibledetect
@@ -0,0 +1,151 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import shutil
+import tempfile
+
+import torch
+
+from constants import CpuDvc, Dvc
+from utils import itp
+
+
+def linkfile(source, target):  # a hard link, or a copy across devices
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+    return
+
+
+class SpillStore:  # segments of the depth frontier kept on disk
+    def __init__(self, pp, rr1):
+        #
+        self.pp = pp
+        self.rr1 = rr1
+        #
+        self.threshold = self.pp.spill_threshold
+        self.directory = None  # made at the first write
+        self.segments = []  # (depth, path, length, multiplicity)
+        self.counter = 0
+        #
+        self.length = 0
+        self.multiplicity_total = 0
+        self.spilled_count = 0
+        self.restored_count = 0
+        #
+
+    def makedirectory(self):
+        if self.directory is None:
+            os.makedirs(self.pp.spill_dir, exist_ok=True)
+            self.directory = tempfile.mkdtemp(
+                prefix="frontier_", dir=self.pp.spill_dir
+            )
+        return
+
+    def write(self, depth, Data):  # in the packed format
+        self.makedirectory()
+        PackedData = self.rr1.packdata(Data)
+        length = int(PackedData["length"])
+        multiplicity = int(PackedData["multiplicity"].sum(0))
+        Contents = {"length": length}
+        for ky in PackedData.keys():
+            if ky != "length":
+                Contents[ky] = PackedData[ky].to(CpuDvc)
+        path = os.path.join(
+            self.directory, "segment_{}.pt".format(self.counter)
+        )
+        self.counter += 1
+        temporary = path + ".tmp"
+        torch.save(Contents, temporary)
+        os.replace(temporary, path)
+        #
+        self.segments.append((depth, path, length, multiplicity))
+        self.length += length
+        self.multiplicity_total += multiplicity
+        self.spilled_count += length
+        return
+
+    def read(self):  # takes back the deepest segment
+        deepest = 0
+        for k in range(len(self.segments)):
+            if self.segments[k][0] > self.segments[deepest][0]:
+                deepest = k
+        depth, path, length, multiplicity = self.segments.pop(deepest)
+        Data = self.load(path, length)
+        os.remove(path)
+        #
+        self.length -= length
+        self.multiplicity_total -= multiplicity
+        self.restored_count += length
+        return depth, Data
+
+    def load(self, path, length):  # one segment, the file is kept
+        try:
+            Contents = torch.load(path, map_location=CpuDvc, mmap=True)
+        except TypeError:  # older torch without mmap
+            Contents = torch.load(path, map_location=CpuDvc)
+        Data = {"length": length}
+        for ky in Contents.keys():
+            if ky != "length":
+                Data[ky] = Contents[ky].to(Dvc).clone()
+        del Contents
+        if not self.pp.packed_pools:
+            Data = self.rr1.unpackdata(Data)
+        return Data
+
+    def iterate(self):  # yields depth, Data of each segment, deepest first
+        for depth, path, length, _ in sorted(
+            self.segments, key=lambda segment: -segment[0]
+        ):
+            yield depth, self.load(path, length)
+        return
+
+    def adopt(self, depth, path, length, multiplicity):
+        # a segment file from elsewhere (a checkpoint), linked in so that
+        # reading it back leaves the original
+        self.makedirectory()
+        target = os.path.join(
+            self.directory, "segment_{}.pt".format(self.counter)
+        )
+        self.counter += 1
+        linkfile(path, target)
+        self.segments.append((depth, target, length, multiplicity))
+        self.length += length
+        self.multiplicity_total += multiplicity
+        return
+
+    def clear(self):  # removes the segments that were not read back
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+        self.segments = []
+        self.length = 0
+        self.multiplicity_total = 0
+        return
+
+    def printstats(self):
+        print(
+            "spilled to disk",
+            itp(self.spilled_count),
+            "read back",
+            itp(self.restored_count),
+            "still on disk",
+            itp(self.length),
+        )
+        return
@@ -0,0 +1,129 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups. 
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from constants import Dvc
+
+
+class StateBatch:  # a growable batch of nodes, indexed like a Data dict
+    __slots__ = ("length", "capacity", "fields")
+
+    def __init__(self, capacity=0):
+        self.length = 0
+        self.capacity = capacity
+        self.fields = None  # the full storage, rows [0:length] are in use
+
+    def __getitem__(self, ky):
+        if ky == "length":
+            return self.length
+        if self.fields is None:
+            return None
+        return self.fields[ky][0 : self.length]
+
+    def keys(self):
+        if self.fields is None:
+            return ["length"]
+        return ["length"] + list(self.fields.keys())
+
+    def allocate(self, Data, capacity):
+        self.fields = {}
+        for ky in Data.keys():
+            if ky != "length":
+                item = Data[ky]
+                self.fields[ky] = torch.empty(
+                    (capacity,) + tuple(item.size()[1:]),
+                    dtype=item.dtype,
+                    device=Dvc,
+                )
+        self.capacity = capacity
+        return
+
+    def grow(self, needed):  # amortized doubling
+        newcapacity = 2 * self.capacity
+        if newcapacity < 16:
+            newcapacity = 16
+        if newcapacity < needed:
+            newcapacity = needed
+        for ky in self.fields.keys():
+            item = self.fields[ky]
+            newitem = torch.empty(
+                (newcapacity,) + tuple(item.size()[1:]),
+                dtype=item.dtype,
+                device=Dvc,
+            )
+            newitem[0 : self.length] = item[0 : self.length]
+            self.fields[ky] = newitem
+        self.capacity = newcapacity
+        return
+
+    def append(self, Data):  # in place, Data is not modified
+        dlength = int(Data["length"])
+        if dlength == 0:
+            return
+        if self.fields is None:
+            capacity = self.capacity
+            if capacity < dlength:
+                capacity = dlength
+            self.allocate(Data, capacity)
+        assert set(self.fields.keys()) == set(Data.keys()) - {"length"}
+        needed = self.length + dlength
+        if needed > self.capacity:
+            self.grow(needed)
+        lower = self.length
+        for ky in self.fields.keys():
+            item = Data[ky]
+            assert item.dtype == self.fields[ky].dtype
+            self.fields[ky][lower:needed] = item
+        self.length = needed
+        return
+
+    def compact(self, detection):  # keeps the rows where detection is True
+        assert len(detection) == self.length
+        if self.length == 0:
+            return
+        indices = torch.nonzero(detection, as_tuple=True)[0]
+        klength = len(indices)
+        if klength == self.length:
+            return
+        for ky in self.fields.keys():
+            item = self.fields[ky]
+            item[0:klength] = item[indices]
+        self.length = klength
+        return
+
+    def poptail(self, amount):  # removes the last rows, returned as copies
+        if amount > self.length:
+            amount = self.length
+        lower = self.length - amount
+        Output = {"length": amount}
+        for ky in self.fields.keys():
+            Output[ky] = self.fields[ky][lower : self.length].clone()
+        self.length = lower
+        return Output
+
+    def clear(self):  # keeps the storage for reuse
+        self.length = 0
+        return
+
+    def view(self):  # a Data dict of views onto the rows in use
+        Output = {"length": self.length}
+        if self.fields is None:
+            return Output
+        for ky in self.fields.keys():
+            Output[ky] = self.fields[ky][0 : self.length]
+        return Output
@@ -0,0 +1,175 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from constants import Dvc
+from symmetric_group import SymmetricGroup
+from transposition import TranspositionTable
+from utils import arangeic, itp
+
+
+class SymmetryReduction:  # representatives under the stabilizer of sigma
+    def __init__(self, pp, rr1, mb):
+        #
+        self.pp = pp
+        self.rr1 = rr1
+        self.MB = mb  # for the slicesize
+        #
+        self.alpha = self.pp.alpha
+        self.beta = self.pp.beta
+        self.betaz = self.beta + 1
+        #
+        # the group S_alpha x S_beta acts by relabelling A and B, the extra
+        # value p = beta staying fixed; the stabilizer of the initial left
+        # table of sigma fixes the root, so it permutes the search nodes
+        self.sga = SymmetricGroup(self.alpha)
+        self.sgb = SymmetricGroup(self.beta)
+        self.stabilizers = {}  # left table key -> (sigmas, taus)
+        #
+        self.hasher = TranspositionTable(pp, rr1)
+        self.saved = {}  # sigma -> number of nodes merged away
+        #
+
+    def stabilizer(self, lefttable):  # lefttable of shape a.bz.2
+        a = self.alpha
+        b = self.beta
+        #
+        values = lefttable[:, 0:b, 1]
+        key = tuple(values.reshape(a * b).tolist())
+        if key in self.stabilizers:
+            return self.stabilizers[key]
+        #
+        gla = self.sga.gtlength
+        glb = self.sgb.gtlength
+        grouptable_a = self.sga.grouptable
+        grouptable_b = self.sgb.grouptable
+        moved = values[
+            grouptable_a.view(gla, 1, a, 1), grouptable_b.view(1, glb, 1, b)
+        ]
+        stab = ((moved == values.view(1, 1, a, b)).all(3)).all(2)
+        ia, ib = stab.nonzero(as_tuple=True)
+        sigmas = grouptable_a[ia]
+        fixed = torch.full((len(ib), 1), b, dtype=torch.int64, device=Dvc)
+        taus = torch.cat((grouptable_b[ib], fixed), 1)
+        #
+        self.stabilizers[key] = (sigmas, taus)
+        return sigmas, taus
+
+    def transform(self, Data, ivector, sigmas, taus):
+        # the state of row ivector[j] relabelled by (sigmas[j], taus[j])
+        a = self.alpha
+        bz = self.betaz
+        n = len(ivector)
+        #
+        Output = {"length": n}
+        Output["prod"] = Data["prod"][
+            ivector.view(n, 1, 1, 1),
+            sigmas.view(n, a, 1, 1),
+            sigmas.view(n, 1, a, 1),
+            taus.view(n, 1, 1, bz),
+        ]
+        Output["left"] = Data["left"][
+            ivector.view(n, 1, 1), sigmas.view(n, a, 1), taus.view(n, 1, bz)
+        ]
+        Output["right"] = Data["right"][
+            ivector.view(n, 1, 1), taus.view(n, bz, 1), sigmas.view(n, 1, a)
+        ]
+        Output["ternary"] = Data["ternary"][
+            ivector.view(n, 1, 1, 1),
+            sigmas.view(n, a, 1, 1),
+            sigmas.view(n, 1, a, 1),
+            sigmas.view(n, 1, 1, a),
+        ]
+        return Output
+
+    def canonicalize(self, Data):
+        # replaces each (unpacked) row by the element of its orbit with the
+        # smallest hash; rows with the same left table share a stabilizer
+        a = self.alpha
+        b = self.beta
+        bz = self.betaz
+        #
+        length = Data["length"]
+        if length == 0:
+            return Data
+        #
+        Output = self.rr1.copydata(Data)
+        lrange = arangeic(length)
+        leftkeys = Data["left"][:, :, 0:b, 1].reshape(length, a * b)
+        uniquekeys, inverse = torch.unique(
+            leftkeys, dim=0, return_inverse=True
+        )
+        for u in range(len(uniquekeys)):
+            rows = lrange[inverse == u]
+            sigmas, taus = self.stabilizer(Data["left"][rows[0]])
+            n = len(sigmas)
+            if n == 1:
+                continue
+            #
+            rowslength = len(rows)
+            step = (16 * self.MB.slicesize) // n
+            if step < 1:
+                step = 1
+            lower = 0
+            while lower < rowslength:
+                upper = lower + step
+                if upper > rowslength:
+                    upper = rowslength
+                r = rows[lower:upper]
+                m = len(r)
+                ivector = r.view(m, 1).expand(m, n).reshape(m * n)
+                svector = (
+                    sigmas.view(1, n, a).expand(m, n, a).reshape(m * n, a)
+                )
+                tvector = (
+                    taus.view(1, n, bz).expand(m, n, bz).reshape(m * n, bz)
+                )
+                Moved = self.transform(Data, ivector, svector, tvector)
+                key1, _ = self.hasher.hashes(self.hasher.staterows(Moved))
+                best = key1.view(m, n).argmin(1) + arangeic(m) * n
+                for ky in self.rr1.packedkeys:
+                    Output[ky][r] = Moved[ky][best]
+                lower = upper
+        return Output
+
+    def countsaved(self, Before, After):  # rows of Before merged away
+        if Before["length"] == 0:
+            return
+        before = torch.bincount(Before["sigma"].to(torch.int64))
+        if After["length"] > 0:
+            after = torch.bincount(
+                After["sigma"].to(torch.int64), minlength=len(before)
+            )
+        else:
+            after = torch.zeros_like(before)
+        difference = before - after
+        for sigma in difference.nonzero(as_tuple=True)[0].tolist():
+            self.saved[sigma] = self.saved.get(sigma, 0) + int(
+                difference[sigma]
+            )
+        return
+
+    def printsaved(self):
+        for sigma in sorted(self.saved.keys()):
+            print(
+                "sigma",
+                sigma,
+                "nodes saved by merging",
+                itp(self.saved[sigma]),
+            )
+        return
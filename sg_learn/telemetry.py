@@ -0,0 +1,169 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+# the fields of a "step" event, in the order of the csv columns
+StepFields = [
+    "proof",
+    "step",
+    "time",
+    "chunk",
+    "children",
+    "active",
+    "done",
+    "impossible",
+    "propagation",
+    "filter",
+    "network",
+    "classifier",
+    "activepool_bytes",
+]
+
+
+class JsonlConsumer:  # one json object per line
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def consume(self, event):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+        return
+
+    def close(self):
+        self.file.close()
+        return
+
+
+class CsvConsumer:  # the step events only
+    def __init__(self, path):
+        newfile = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.DictWriter(
+            self.file, fieldnames=StepFields, extrasaction="ignore"
+        )
+        if newfile:
+            self.writer.writeheader()
+
+    def consume(self, event):
+        if event["event"] == "step":
+            self.writer.writerow(event)
+            self.file.flush()
+        return
+
+    def close(self):
+        self.file.close()
+        return
+
+
+class PrintConsumer:  # the progress dots of proofloop and its terminator
+    def __init__(self, pp):
+        self.pp = pp
+
+    def consume(self, event):
+        if event["event"] == "end":  # the steps of a proof are over
+            print("|||")
+            return
+        # in verbose mode proofloop prints its own report of each step
+        if event["event"] != "step" or self.pp.verbose:
+            return
+        i = event["step"]
+        print(".", end="", flush=True)
+        if (i % 50) == 49:
+            print(" ")
+        if (i % 100) == 0:
+            print(i)
+        return
+
+    def close(self):
+        return
+
+
+class Telemetry:  # events from the proof loop, consumed in a writer thread
+    def __init__(self, pp):
+        #
+        self.pp = pp
+        #
+        self.consumers = []
+        path = self.pp.telemetry_path
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            if path.endswith(".csv"):
+                self.consumers.append(CsvConsumer(path))
+            else:
+                self.consumers.append(JsonlConsumer(path))
+        if self.pp.telemetry_print:
+            self.consumers.append(PrintConsumer(pp))
+        #
+        self.queue = queue.Queue()
+        self.thread = None
+        self.proof = 0
+        #
+
+    def addconsumer(self, consumer):  # with consume(event) and close()
+        self.consumers.append(consumer)
+        return
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.write, daemon=True)
+        self.thread.start()
+        return
+
+    def write(self):
+        while True:
+            event = self.queue.get()
+            try:
+                if event is None:
+                    return
+                for consumer in self.consumers:
+                    consumer.consume(event)
+            finally:
+                self.queue.task_done()
+
+    def emit(self, event, **fields):
+        if len(self.consumers) == 0:
+            return
+        self.start()
+        fields["event"] = event
+        fields["proof"] = self.proof
+        fields["time"] = time.time()
+        self.queue.put(fields)
+        return
+
+    def flush(self):
+        if self.thread is not None:
+            self.queue.join()
+        return
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        for consumer in self.consumers:
+            consumer.close()
+        self.consumers = []
+        return
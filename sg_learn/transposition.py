@@ -0,0 +1,143 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import torch
+
+from constants import CpuDvc, Dvc
+
+
+class TranspositionTable:  # merges identical nodes, adding multiplicities
+    def __init__(self, pp, rr1):
+        #
+        self.pp = pp
+        self.rr1 = rr1
+        #
+        # two independent random linear hashes of the state bytes; rows with
+        # the same pair of hashes are then compared exactly
+        self.generator = torch.Generator(device=CpuDvc)
+        self.generator.manual_seed(self.pp.transposition_seed)
+        self.weights1 = None
+        self.weights2 = None
+        #
+        self.merged_count = 0
+        #
+
+    def staterows(self, Data):  # the state fields as one byte row per node
+        length = Data["length"]
+        return torch.cat(
+            [
+                Data[ky].reshape(length, -1).to(torch.uint8)
+                for ky in self.rr1.packedkeys
+            ],
+            1,
+        )
+
+    def makeweights(self, width):
+        self.weights1 = torch.randint(
+            -(2 ** 62),
+            2 ** 62,
+            (width,),
+            dtype=torch.int64,
+            generator=self.generator,
+        ).to(Dvc)
+        self.weights2 = torch.randint(
+            -(2 ** 62),
+            2 ** 62,
+            (width,),
+            dtype=torch.int64,
+            generator=self.generator,
+        ).to(Dvc)
+        return
+
+    def hashes(self, rows):  # int64 arithmetic wraps around
+        width = rows.size(1)
+        if self.weights1 is None or len(self.weights1) != width:
+            self.makeweights(width)
+        rows64 = rows.to(torch.int64)
+        key1 = (rows64 * self.weights1.view(1, width)).sum(1)
+        key2 = (rows64 * self.weights2.view(1, width)).sum(1)
+        return key1, key2
+
+    def sortorder(self, key1, key2):  # lexicographic in (key1, key2)
+        _, order = torch.sort(key2, stable=True)
+        _, order1 = torch.sort(key1[order], stable=True)
+        return order[order1]
+
+    def dedup(self, Data):  # keeps one row of each state
+        length = Data["length"]
+        if length <= 1:
+            return Data
+        #
+        rows = self.staterows(Data)
+        key1, key2 = self.hashes(rows)
+        order = self.sortorder(key1, key2)
+        key1s = key1[order]
+        key2s = key2[order]
+        rowss = rows[order]
+        #
+        same = (
+            (key1s[1:] == key1s[:-1])
+            & (key2s[1:] == key2s[:-1])
+            & ((rowss[1:] == rowss[:-1]).all(1))
+        )
+        if not same.any(0):
+            return Data
+        duplicate = torch.cat(
+            (torch.zeros((1), dtype=torch.bool, device=Dvc), same), 0
+        )
+        runid = torch.cumsum((~duplicate).to(torch.int64), 0) - 1
+        keep = order[~duplicate]
+        multiplicity = torch.zeros(
+            (len(keep)), dtype=torch.int64, device=Dvc
+        )
+        multiplicity.index_add_(0, runid, Data["multiplicity"][order])
+        #
+        Output = self.rr1.indexselectdata(Data, keep)
+        Output["multiplicity"] = multiplicity
+        self.merged_count += length - len(keep)
+        return Output
+
+    def mergeinto(self, Pool, Data):
+        # the rows of Data already in Pool have their multiplicities added
+        # there in place; returns the other rows. Data should have no
+        # repeated rows (see dedup).
+        plength = Pool["length"]
+        length = Data["length"]
+        if plength == 0 or length == 0:
+            return Data
+        #
+        poolrows = self.staterows(Pool)
+        pkey1, pkey2 = self.hashes(poolrows)
+        rows = self.staterows(Data)
+        key1, key2 = self.hashes(rows)
+        #
+        pkey1s, porder = torch.sort(pkey1)
+        position = torch.searchsorted(pkey1s, key1)
+        position = torch.clamp(position, 0, plength - 1)
+        candidate = porder[position]
+        found = (pkey1[candidate] == key1) & (pkey2[candidate] == key2)
+        checked = found.clone()
+        found[checked] = (poolrows[candidate[checked]] == rows[checked]).all(1)
+        #
+        foundlength = int(found.to(torch.int64).sum(0))
+        if foundlength == 0:
+            return Data
+        Pool["multiplicity"].index_add_(
+            0, candidate[found], Data["multiplicity"][found]
+        )
+        self.merged_count += foundlength
+        return self.rr1.detectsubdata(Data, ~found)
@@ -0,0 +1,126 @@
+"""
+    Machine learning proofs for classification of nilpotent semigroups.
+    Copyright (C) 2021  Carlos Simpson
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import math
+
+import torch
+
+from constants import Dvc
+from relations_4 import Relations4
+from utils import arangeic
+
+
+class TreeSizeEstimator:  # Knuth's random probes for the size of a proof
+    def __init__(self, rr4: Relations4):
+        #
+        self.rr4 = rr4
+        self.rr3 = rr4.rr3
+        self.rr1 = rr4.rr1
+        self.pp = rr4.pp
+        self.HST = rr4.HST
+        #
+
+    def pickone(self, group, weight):
+        # one row of each group, with probability proportional to weight,
+        # by keeping the largest u ** (1 / weight) for u uniform in (0,1)
+        n = len(group)
+        key = torch.rand(n, device=Dvc) ** (1.0 / weight.to(torch.float))
+        _, order = torch.sort(key, descending=True)
+        _, order1 = torch.sort(group[order], stable=True)
+        order = order[order1]
+        sortedgroup = group[order]
+        first = torch.ones((n), dtype=torch.bool, device=Dvc)
+        first[1:] = sortedgroup[1:] != sortedgroup[:-1]
+        return order[first]
+
+    def saveproofcounters(self):
+        return (
+            self.HST.current_proof_valency_frequency.clone(),
+            self.HST.current_proof_impossible_count,
+            self.HST.current_proof_done_count,
+            self.HST.current_proof_passive_count,
+        )
+
+    def restoreproofcounters(self, counters):
+        self.HST.current_proof_valency_frequency[:] = counters[0]
+        self.HST.current_proof_impossible_count = counters[1]
+        self.HST.current_proof_done_count = counters[2]
+        self.HST.current_proof_passive_count = counters[3]
+        return
+
+    def estimate(self, M, Input, probes):
+        # each probe goes down from a random active root, through a random
+        # active child at each level, with the cuts chosen by M; the sum of
+        # the products of the numbers of active children along the way is
+        # an unbiased estimate of the cumulative nodes ECN of a full proof.
+        # Returns the mean over the probes and a confidence interval.
+        ProcessedData, activedetect, _, _ = self.rr4.RC.processedroots(Input)
+        Roots = self.rr1.detectsubdata(ProcessedData, activedetect)
+        if Roots["length"] == 0:
+            return 0.0, 0.0, 0.0
+        rootcount = float(self.rr1.multiplicitysum(Roots))
+        #
+        choice = torch.multinomial(
+            Roots["multiplicity"].to(torch.float), probes, replacement=True
+        )
+        Current = self.rr1.indexselectdata(Roots, choice)
+        # the location column carries the probe number down to the children
+        Current["location"] = arangeic(probes).to(torch.int32)
+        Current["multiplicity"] = torch.ones(
+            (probes), dtype=torch.int64, device=Dvc
+        )
+        weight = torch.full(
+            (probes,), rootcount, dtype=torch.float64, device=Dvc
+        )
+        total = weight.clone()
+        #
+        # nodes of different probes should not be merged
+        symmetry_reduction = self.pp.symmetry_reduction
+        self.pp.symmetry_reduction = False
+        counters = self.saveproofcounters()
+        for depth in range(self.pp.prooflooplength):
+            if Current["length"] == 0:
+                break
+            Children, _ = self.rr3.managesplit(
+                M, self.rr1.unpackdata(Current), False
+            )
+            if Children["length"] == 0:
+                break
+            probe = Children["location"].to(torch.int64)
+            multiplicity = Children["multiplicity"]
+            count = torch.zeros((probes), dtype=torch.float64, device=Dvc)
+            count.index_add_(0, probe, multiplicity.to(torch.float64))
+            # the probes without active children stay at weight 0
+            weight = weight * count
+            total += weight
+            #
+            Current = self.rr1.indexselectdata(
+                Children, self.pickone(probe, multiplicity)
+            )
+            Current["multiplicity"] = torch.ones(
+                (Current["length"]), dtype=torch.int64, device=Dvc
+            )
+        self.restoreproofcounters(counters)
+        self.pp.symmetry_reduction = symmetry_reduction
+        #
+        mean = float(total.mean(0))
+        if probes < 2:
+            return mean, mean, mean
+        halfwidth = (
+            self.pp.estimator_z * float(total.std(0)) / math.sqrt(probes)
+        )
+        return mean, mean - halfwidth, mean + halfwidth
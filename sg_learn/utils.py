@@ -16,6 +16,8 @@
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import gc
+import os
+import resource
 
 import numpy as np
 import torch
@@ -120,6 +122,18 @@ def memReport(style):  # by QuantScientist Solomon K @smth
     return
 
 
+def processrss():  # resident memory of this process in bytes
+    if Dvc.type == "cuda":
+        return torch.cuda.memory_allocated(Dvc)
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # peak rather than current, in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
 def arangeic(x):
     ar = torch.arange(x, dtype=torch.int64, device=Dvc)
     return ar